@@ -1,9 +1,14 @@
+import asyncio
+import sys
+from collections import namedtuple
 from i3ipc import Connection, Event
-from threading import Thread
-from time import sleep
+from i3ipc.aio import Connection as AioConnection
+from threading import Condition, RLock, Thread
+from time import monotonic, sleep
 
 
 FRAME_T = 0.01  # time taken between each frame of fade
+OPACITY_STEP = 0.01  # opacities are sent rounded to this, unchanged ones are not sent again
 
 # transparency values
 CON_AC     = 1     # active window
@@ -29,94 +34,174 @@ FLOAT_BOT_OUT  = FADE_TIME      # floating window fading out from bottom
 FLOAT_BOT_IN   = FADE_TIME      # floating window fading in from bottom
 
 
-class Fader:
+# a running fade: opacity goes from start to target over duration seconds from began
+Fade = namedtuple("Fade", "con_id start target began duration")
+
+
+def fade_opacity(fade, now):
+    progress = (now - fade.began) / fade.duration
+    if progress >= 1:
+        return fade.target
+    return fade.start + (fade.target - fade.start) * progress
+
+
+def quantise(opacity):
+    return round(round(opacity / OPACITY_STEP) * OPACITY_STEP, 6)
+
+
+def opacity_command(changes, index):
+    # one command for all (con_id, opacity) changes, leaving out windows
+    # the index knows are at that rounded opacity already; hidden windows
+    # keep theirs for when they are shown. None if nothing is left to send
+    commands = []
+    for con_id, opacity in changes:
+        opacity = quantise(opacity)
+        state = index.windows.get(con_id)
+        if state and not state.visible:
+            state.deferred = opacity
+            continue
+        if state:
+            state.deferred = None
+            if state.opacity == opacity:
+                continue
+            state.opacity = opacity
+        commands.append("[con_id=" + str(con_id) + "] opacity " + str(opacity))
+    if commands:
+        return "; ".join(commands)
+
+
+class WindowState:
+    __slots__ = ("type", "workspace", "output", "visible", "opacity", "deferred")
+
+    def __init__(self, con_type, workspace, output, visible):
+        self.type      = con_type
+        self.workspace = workspace
+        self.output    = output
+        self.visible   = visible
+        self.opacity   = None  # unknown until swayfader sets it
+        self.deferred  = None  # opacity to set once the window is shown
+
+
+class WindowIndex:
+    # con_id -> WindowState of every window, built from one tree walk and
+    # then kept current from window and workspace events
     def __init__(self):
+        self.windows = {}
+        self.outputs = {}     # workspace name -> output
+        self.shown   = {}     # output -> workspace it shows
+        self.visible = set()  # workspaces in shown
+        self.focused = None   # focused workspace, where new windows open
+        self.lock    = RLock()
+
+    def build(self, tree, workspaces):
+        with self.lock:
+            self.set_workspaces(workspaces)
+            for ws in tree.workspaces():
+                for win in ws.descendants():
+                    if win.type in ("con", "floating_con"):
+                        self.add(win, ws.name)
+
+    def set_workspaces(self, workspaces):
+        with self.lock:
+            self.outputs = {ws.name: ws.output for ws in workspaces}
+            self.shown   = {ws.output: ws.name for ws in workspaces if ws.visible}
+            self.visible = set(self.shown.values())
+            for ws in workspaces:
+                if ws.focused:
+                    self.focused = ws.name
+            for state in self.windows.values():
+                state.output  = self.outputs.get(state.workspace)
+                state.visible = state.workspace in self.visible
+
+    def add(self, win, workspace=None):
+        workspace = workspace or self.focused
+        with self.lock:
+            self.windows[win.id] = WindowState(
+                win.type, workspace,
+                self.outputs.get(workspace), workspace in self.visible)
+
+    def move(self, con_id, workspace):
+        with self.lock:
+            state = self.windows.get(con_id)
+            if state:
+                state.workspace = workspace
+                state.output    = self.outputs.get(workspace)
+                state.visible   = workspace in self.visible
+
+    def show(self, con_id):
+        # a focused window is on screen; scratchpad show only sends a focus
+        # event, so one still filed under a hidden workspace moves to the
+        # focused one
+        with self.lock:
+            state = self.windows.get(con_id)
+            if state and not state.visible:
+                self.move(con_id, self.focused)
+                state.visible = True
+
+    def set_type(self, con_id, con_type):
+        with self.lock:
+            state = self.windows.get(con_id)
+            if state:
+                state.type = con_type
+
+    def is_visible(self, con_id):
+        state = self.windows.get(con_id)
+        return not state or state.visible
+
+    def revealed(self):
+        # (con_id, opacity) held back for windows that are now visible
+        with self.lock:
+            return [(con_id, state.deferred) for con_id, state in self.windows.items()
+                    if state.visible and state.deferred is not None]
+
+    def remove(self, con_id):
+        with self.lock:
+            self.windows.pop(con_id, None)
+
+
+class FadeRules:
+    # which windows fade to what on each event, shared by both engines;
+    # an engine provides add_fade(), drop_fade() and change_opacity()
+    def __init__(self):
+        self.index            = WindowIndex()
         self.floating_windows = []
-        self.fader_running    = False
-        self.fade_queue       = []
-        self.fade_data        = {}
         self.bottom_win       = None
         self.old_win          = None
         self.active_win       = None
 
-        ipc = Connection()
-        ipc.on(Event.WINDOW_FOCUS,    self.on_window_focus)
-        ipc.on(Event.WINDOW_NEW,      self.on_window_new)
-        ipc.on(Event.WINDOW_FLOATING, self.on_window_floating)
-
-        for win in ipc.get_tree():
+    def startup(self, tree, workspaces):
+        self.index.build(tree, workspaces)
+        changes = []
+        for win in tree:
             if win.type == "floating_con":
                 self.floating_windows.append(win.id)
                 if win.focused:
-                    change_opacity(win, FLOAT_AC)
+                    changes.append((win.id, FLOAT_AC))
                     self.active_win = win
                 else:
-                    change_opacity(win, FLOAT_INAC)
+                    changes.append((win.id, FLOAT_INAC))
             elif win.type == "con":
                 if win.focused:
                     self.active_win = win
-                    change_opacity(win, CON_AC)
+                    changes.append((win.id, CON_AC))
                 else:
-                    change_opacity(win, CON_INAC)
+                    changes.append((win.id, CON_INAC))
+        self.change_opacity(changes)
 
-        ipc.main()
-
-    def add_fade(self, win, start, target, duration):
-        if not duration:
-            if win.id in self.fade_queue:
-                self.fade_queue.remove(win.id)
-                del self.fade_data[win.id]
-            change_opacity(win, target)
-            return
+    def set_opacity(self, win, opacity):
+        self.add_fade(win, opacity, opacity, 0)
 
-        if win.id in self.fade_queue:
-            f = self.fade_data[win.id]
-            change = (FRAME_T / duration) * (target - f["opacity"])
-            f["change"] = change
-            f["target"] = target
+    def on_window_focus(self, ipc, e):
+        if e.container.id not in self.index.windows:
+            self.index.add(e.container)
+        self.index.show(e.container.id)
+        self.change_opacity(self.index.revealed())
+
+        if not self.active_win:
+            self.set_opacity(e.container, CON_AC if e.container.type == "con" else FLOAT_AC)
+            self.active_win = e.container
             return
 
-        change_opacity(win, start)
-        change = (FRAME_T / duration) * (target - start)
-        fade_data = {"opacity": start, "change": change, "target": target, "win": win}
-        self.fade_queue.append(win.id)
-        self.fade_data[win.id] = fade_data
-
-    def start_fader(self):
-        if not self.fader_running:
-            self.fader_running = True
-            Thread(target=self.fader).start()
-
-    def fader(self):
-        while self.fade_queue:
-            for win_id in self.fade_queue.copy():
-                try:
-                    f = self.fade_data[win_id]
-                except KeyError:
-                    continue
-                f["opacity"] += f["change"]
-
-                finished = False
-                if f["change"] > 0:
-                    if f["opacity"] >= f["target"]:
-                        finished = True
-                elif f["opacity"] <= f["target"]:
-                    finished = True
-
-                if finished:
-                    change_opacity(f["win"], f["target"])
-                    try:
-                        self.fade_queue.remove(win_id)
-                        del self.fade_data[win_id]
-                    except (KeyError, ValueError):
-                        continue
-                else:
-                    change_opacity(f["win"], f["opacity"])
-
-            sleep(FRAME_T)
-        self.fader_running = False
-
-    def on_window_focus(self, ipc, e):
         if self.active_win.id == e.container.id:
             return
 
@@ -171,59 +256,272 @@ class Fader:
                     e.container, FLOAT_INAC,
                     FLOAT_AC, FLOAT_IN)
 
-        self.start_fader()
         self.active_win = e.container
 
     def on_window_new(self, ipc, e):
+        self.index.add(e.container)
+
         if self.active_win:
             if self.active_win.type == "con":
-                change_opacity(self.active_win, CON_INAC)
+                self.set_opacity(self.active_win, CON_INAC)
             else:
-                change_opacity(self.active_win, FLOAT_INAC)
+                self.set_opacity(self.active_win, FLOAT_INAC)
 
         if self.bottom_win:
-            change_opacity(self.bottom_win, CON_INAC)
+            self.set_opacity(self.bottom_win, CON_INAC)
 
         elif self.active_win and self.active_win.type == "con":
             self.bottom_win = self.active_win
-            change_opacity(self.bottom_win, CON_INAC)
+            self.set_opacity(self.bottom_win, CON_INAC)
 
-        change_opacity(e.container, CON_AC)
+        self.set_opacity(e.container, CON_AC)
         self.old_win = self.active_win
         self.active_win = e.container
 
     def on_window_floating(self, ipc, e):
         c_id = e.container.id
+        self.index.set_type(c_id, e.container.type)
         if c_id not in self.floating_windows:
             self.floating_windows.append(c_id)
 
-            if self.active_win.id != e.container.id:
-                change_opacity(e.container, FLOAT_INAC)
+            if not self.active_win or self.active_win.id != e.container.id:
+                self.set_opacity(e.container, FLOAT_INAC)
 
             else:
                 if self.old_win and self.bottom_win:
                     if self.old_win.type == "con":
                         self.bottom_win = self.old_win
-                    change_opacity(self.bottom_win, BOT_INAC)
-                change_opacity(e.container, FLOAT_AC)
+                    self.set_opacity(self.bottom_win, BOT_INAC)
+                self.set_opacity(e.container, FLOAT_AC)
 
         else:
             self.floating_windows.remove(c_id)
-            if self.active_win.id != e.container.id:
-                change_opacity(e.container, CON_INAC)
+            if not self.active_win or self.active_win.id != e.container.id:
+                self.set_opacity(e.container, CON_INAC)
 
             else:
                 if self.old_win and self.old_win.type == "con":
-                    change_opacity(self.old_win, CON_INAC)
-                change_opacity(self.active_win, CON_AC)
+                    self.set_opacity(self.old_win, CON_INAC)
+                self.set_opacity(self.active_win, CON_AC)
 
         self.active_win = e.container
 
+    def on_window_close(self, ipc, e):
+        # forget the window so nothing gets commanded to it later
+        c_id = e.container.id
+        self.drop_fade(c_id)
+        self.index.remove(c_id)
+        if c_id in self.floating_windows:
+            self.floating_windows.remove(c_id)
+        if self.active_win and self.active_win.id == c_id:
+            self.active_win = None
+        if self.bottom_win and self.bottom_win.id == c_id:
+            self.bottom_win = None
+        if self.old_win and self.old_win.id == c_id:
+            self.old_win = None
 
-def change_opacity(win, trans):
-    win.command("opacity " + str(trans))
 
+class Fader(FadeRules):
+    # fades run on one scheduler thread, events on the i3ipc main loop
+    def __init__(self):
+        super().__init__()
+        self.fades     = {}  # con_id -> Fade, guarded by fade_cond
+        self.fade_cond = Condition()
 
-if __name__ == "__main__":
-    Fader()
+        ipc = Connection()
+        self.ipc = ipc
+        Thread(target=self.fader, daemon=True).start()
+
+        ipc.on(Event.WINDOW_FOCUS,    self.on_window_focus)
+        ipc.on(Event.WINDOW_NEW,      self.on_window_new)
+        ipc.on(Event.WINDOW_FLOATING, self.on_window_floating)
+        ipc.on(Event.WINDOW_CLOSE,    self.on_window_close)
+        ipc.on(Event.WINDOW_MOVE,     self.on_window_move)
+        ipc.on(Event.WORKSPACE,       self.on_workspace)
+
+        self.startup(ipc.get_tree(), ipc.get_workspaces())
+        ipc.main()
 
+    def add_fade(self, win, start, target, duration):
+        if not self.index.is_visible(win.id):
+            duration = 0  # nobody would see the frames
+        now = monotonic()
+        # sent under fade_cond like the frames, so a frame computed before
+        # this can't land after it
+        with self.fade_cond:
+            running = self.fades.pop(win.id, None)
+            if duration:
+                if running:
+                    # retarget from wherever the running fade has got to
+                    start = fade_opacity(running, now)
+                self.fades[win.id] = Fade(win.id, start, target, now, duration)
+                self.fade_cond.notify()
+
+            if not duration:
+                self.change_opacity([(win.id, target)])
+            elif not running:
+                self.change_opacity([(win.id, start)])
+
+    def drop_fade(self, con_id):
+        with self.fade_cond:
+            self.fades.pop(con_id, None)
+
+    def fader(self):
+        # one long-lived scheduler: sleeps while idle, otherwise draws a frame
+        # every FRAME_T, each fade's opacity taken from the time it has run
+        next_frame = monotonic()
+        while True:
+            with self.fade_cond:
+                while not self.fades:
+                    self.fade_cond.wait()
+                    next_frame = monotonic()
+                now = monotonic()
+                frame = []
+                for con_id, fade in list(self.fades.items()):
+                    opacity = fade_opacity(fade, now)
+                    if opacity == fade.target:
+                        del self.fades[con_id]
+                    frame.append((con_id, opacity))
+
+                # still under fade_cond: a fade replaced meanwhile would
+                # otherwise have its new opacity overwritten by this frame
+                self.change_opacity(frame)
+
+            next_frame += FRAME_T
+            delay = next_frame - monotonic()
+            if delay > 0:
+                sleep(delay)
+            else:
+                # IPC ran over the frame, skip ahead instead of bursting
+                next_frame = monotonic()
+
+    def change_opacity(self, changes):
+        with self.index.lock:
+            command = opacity_command(changes, self.index)
+            if command:
+                self.ipc.command(command)
+
+    def on_window_move(self, ipc, e):
+        # move events don't say where to, so look the window up once
+        con = ipc.get_tree().find_by_id(e.container.id)
+        if con and con.workspace():
+            self.index.move(con.id, con.workspace().name)
+            self.change_opacity(self.index.revealed())
+
+    def on_workspace(self, ipc, e):
+        self.index.set_workspaces(ipc.get_workspaces())
+        self.change_opacity(self.index.revealed())
+
+
+class AsyncFader(FadeRules):
+    # events, fades and commands share one asyncio loop: every fade is a
+    # coroutine, cancelled when its window is retargeted, and a writer
+    # sends whatever the fades queued without holding up the events
+    def __init__(self):
+        super().__init__()
+        self.tasks   = {}  # con_id -> task running its fade
+        self.current = {}  # con_id -> opacity its running fade has reached
+        self.pending = {}  # con_id -> opacity waiting for the writer
+        self.ipc     = None
+        self.wakeup  = None
+        self.events  = None
+
+    async def run(self):
+        self.wakeup = asyncio.Event()
+        self.events = asyncio.Lock()
+        self.ipc = await AioConnection(auto_reconnect=True).connect()
+        self.ipc.on(Event.WINDOW_FOCUS,    self.in_order(self.on_window_focus))
+        self.ipc.on(Event.WINDOW_NEW,      self.in_order(self.on_window_new))
+        self.ipc.on(Event.WINDOW_FLOATING, self.in_order(self.on_window_floating))
+        self.ipc.on(Event.WINDOW_CLOSE,    self.in_order(self.on_window_close))
+        self.ipc.on(Event.WINDOW_MOVE,     self.in_order(self.on_window_move))
+        self.ipc.on(Event.WORKSPACE,       self.in_order(self.on_workspace))
+
+        writer = asyncio.ensure_future(self.writer())
+        self.startup(await self.ipc.get_tree(), await self.ipc.get_workspaces())
+        try:
+            await self.ipc.main()
+        finally:
+            writer.cancel()
+
+    def in_order(self, handler):
+        # i3ipc.aio runs every handler as its own task, so a focus could be
+        # applied while the workspace switch before it still awaits
+        # get_workspaces; the lock is taken in arrival order and lets each
+        # event finish before the next one is applied
+        async def handle(ipc, e):
+            async with self.events:
+                result = handler(ipc, e)
+                if asyncio.iscoroutine(result):
+                    await result
+        return handle
+
+    def add_fade(self, win, start, target, duration):
+        if not self.index.is_visible(win.id):
+            duration = 0  # nobody would see the frames
+        task = self.tasks.pop(win.id, None)
+        if task:
+            # retarget from wherever the cancelled fade has got to
+            task.cancel()
+            start = self.current.get(win.id, start)
+
+        if not duration:
+            self.current.pop(win.id, None)
+            self.change_opacity([(win.id, target)])
+            return
+
+        self.tasks[win.id] = asyncio.ensure_future(self.fade(Fade(
+            win.id, start, target, asyncio.get_running_loop().time(), duration)))
+
+    def drop_fade(self, con_id):
+        task = self.tasks.pop(con_id, None)
+        if task:
+            task.cancel()
+        self.current.pop(con_id, None)
+        self.pending.pop(con_id, None)
+
+    async def fade(self, fade):
+        loop = asyncio.get_running_loop()
+        while True:
+            opacity = fade_opacity(fade, loop.time())
+            self.current[fade.con_id] = opacity
+            self.change_opacity([(fade.con_id, opacity)])
+            if opacity == fade.target:
+                break
+            await asyncio.sleep(FRAME_T)
+
+        # not reached when cancelled, the retargeting fade owns the entries
+        del self.tasks[fade.con_id]
+        del self.current[fade.con_id]
+
+    def change_opacity(self, changes):
+        self.pending.update(changes)
+        self.wakeup.set()
+
+    async def writer(self):
+        # fades woken for the same frame queue their values before the
+        # writer runs, so each frame goes out as one command
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            changes, self.pending = self.pending, {}
+            command = opacity_command(changes.items(), self.index)
+            if command:
+                await self.ipc.command(command)
+
+    async def on_window_move(self, ipc, e):
+        con = (await ipc.get_tree()).find_by_id(e.container.id)
+        if con and con.workspace():
+            self.index.move(con.id, con.workspace().name)
+            self.change_opacity(self.index.revealed())
+
+    async def on_workspace(self, ipc, e):
+        self.index.set_workspaces(await ipc.get_workspaces())
+        self.change_opacity(self.index.revealed())
+
+
+if __name__ == "__main__":
+    if "--async" in sys.argv[1:]:
+        asyncio.run(AsyncFader().run())
+    else:
+        Fader()
@@ -0,0 +1,166 @@
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from airbnb_parsing import PRICE_PATTERN
+from airbnb_store import ResultStore
+
+PERCENTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+IQR_FACTOR = 1.5     # per-night prices beyond this many IQRs outside the quartiles are outliers
+HISTOGRAM_BINS = 12
+
+# Columns of the analysed frame, in the order they are written
+COLUMNS = ['room_id', 'check_in', 'check_out', 'nights', 'currency', 'amount', 'per_night', 'original_amount',
+           'discount_depth', 'outlier', 'status', 'source', 'scraped_at']
+
+def parse_amounts(text):
+    """(amount, currency) Series from a Series of price texts like "฿13,952" or "1 234 zł", NaN where none"""
+    parts = text.astype('string').str.extract(PRICE_PATTERN)
+    amount = parts['prefix_amount'].fillna(parts['suffix_amount']).str.replace(r'[,\s]', '', regex=True)
+    return pd.to_numeric(amount, errors='coerce'), parts['prefix'].fillna(parts['suffix'])
+
+def load_results(paths):
+    """Frame of the result records streamed to .jsonl/.csv files by airbnb_scraper.py --output"""
+    frames = []
+    for path in paths:
+        if path.endswith('.jsonl'):
+            frames.append(pd.read_json(path, lines=True, dtype=False, convert_dates=False))
+        else:
+            frames.append(pd.read_csv(path, dtype=str, keep_default_na=False))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).replace('', np.nan)
+
+def load_history(path):
+    """Frame of every scrape recorded in the result store's history table"""
+    ResultStore(path).close()  # brings an older history table up to the current schema
+    with sqlite3.connect(path) as conn:
+        frame = pd.read_sql_query(
+            "SELECT room_id, check_in, check_out, amount, currency, status, scraped_at FROM history", conn)
+    frame['source'] = 'history'
+    return frame
+
+def analyse(frame, latest=False):
+    """Normalise a frame of results to per-night prices and flag outliers and discounts
+
+    Amounts and currencies come from the structured columns where a record
+    has them, otherwise they are parsed out of the price text. The stay
+    length comes from the dates, falling back to the nights the price was
+    quoted for. With `latest`, only the newest record of each stay is kept.
+    """
+    frame = frame.reindex(columns=sorted(set(frame.columns) | set(COLUMNS) | {'price', 'original_price'}))
+    if latest and frame['scraped_at'].notna().any():
+        frame = frame.sort_values('scraped_at', kind='stable').drop_duplicates(
+            ['room_id', 'check_in', 'check_out'], keep='last')
+
+    # The regex only runs on the records that lack structured values
+    amount = pd.to_numeric(frame['amount'], errors='coerce')
+    currency = frame['currency']
+    unparsed = (amount.isna() | currency.isna()) & frame['price'].notna()
+    parsed_amount, parsed_currency = parse_amounts(frame.loc[unparsed, 'price'])
+    amount = amount.fillna(parsed_amount)
+    currency = currency.fillna(parsed_currency)
+
+    stay_days = (pd.to_datetime(frame['check_out'], errors='coerce')
+                 - pd.to_datetime(frame['check_in'], errors='coerce')).dt.days
+    nights = stay_days.where(stay_days > 0).fillna(pd.to_numeric(frame['nights'], errors='coerce'))
+
+    original_amount, _ = parse_amounts(frame.loc[frame['original_price'].notna(), 'original_price'])
+    original_amount = original_amount.reindex(frame.index)
+    discounted = original_amount > amount
+
+    out = pd.DataFrame({
+        'room_id': frame['room_id'].astype('string'),
+        'check_in': frame['check_in'].astype('string'),
+        'check_out': frame['check_out'].astype('string'),
+        'nights': nights.astype('Int16'),
+        'currency': currency.astype('category'),
+        'amount': amount.astype('float32'),
+        'per_night': (amount / nights).astype('float32'),
+        'original_amount': original_amount.astype('float32'),
+        'discount_depth': (1 - amount / original_amount).where(discounted).astype('float32'),
+        'status': frame['status'].astype('category'),
+        'source': frame['source'].astype('category'),
+        'scraped_at': pd.to_numeric(frame['scraped_at'], errors='coerce'),
+    }, index=frame.index)
+
+    # Tukey fences on the per-night price, within each currency
+    per_night = out.groupby('currency', observed=True)['per_night']
+    q1 = per_night.transform('quantile', 0.25)
+    q3 = per_night.transform('quantile', 0.75)
+    fence = IQR_FACTOR * (q3 - q1)
+    out['outlier'] = (out['per_night'] < q1 - fence) | (out['per_night'] > q3 + fence)
+    return out[COLUMNS].reset_index(drop=True)
+
+def summarise(analysed):
+    """Per-currency count, mean, spread and percentiles of the per-night price, with outlier and discount counts"""
+    priced = analysed[analysed['per_night'].notna()]
+    grouped = priced.groupby('currency', observed=True)
+    summary = grouped['per_night'].describe(percentiles=list(PERCENTILES))
+    summary['outliers'] = grouped['outlier'].sum()
+    summary['discounted'] = grouped['discount_depth'].count()
+    summary['mean_discount'] = grouped['discount_depth'].mean()
+    summary['max_discount'] = grouped['discount_depth'].max()
+    return summary
+
+def format_distribution(values, width=30):
+    """Text rows of a per-night price histogram, outliers already left out"""
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    peak = max(1, counts.max())
+    return [f"{low:>10,.0f}–{high:<10,.0f} {'█' * max(1, round(count / peak * width))} {count}"
+            for count, low, high in zip(counts, edges[:-1], edges[1:]) if count]
+
+def print_report(analysed, summary):
+    print("=" * 60)
+    print("📊 PER-NIGHT PRICES")
+    print("=" * 60)
+    statuses = analysed['status'].value_counts()
+    print(f"📄 Records: {len(analysed)} ("
+          + ", ".join(f"{status} {count}" for status, count in statuses.items() if count) + ")")
+    for currency, row in summary.iterrows():
+        print("-" * 60)
+        print(f"💱 {currency}: {row['count']:.0f} priced stays, mean {row['mean']:,.0f}, std {row['std']:,.0f}")
+        print("   " + "  ".join(f"p{p * 100:g} {row[f'{p * 100:g}%']:,.0f}" for p in PERCENTILES))
+        print(f"   🧨 Outliers: {row['outliers']:.0f}")
+        if row['discounted']:
+            print(f"   🏷️  Discounted: {row['discounted']:.0f}, mean depth {row['mean_discount']:.0%}, "
+                  f"deepest {row['max_discount']:.0%}")
+        values = analysed.loc[(analysed['currency'] == currency) & ~analysed['outlier'], 'per_night'].dropna()
+        for line in format_distribution(values.to_numpy()):
+            print(f"   {line}")
+    print("=" * 60)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Normalise scraped Airbnb prices to per-night amounts and summarise their distribution")
+    parser.add_argument('results', nargs='*', metavar='PATH',
+                        help=".jsonl or .csv files written by airbnb_scraper.py --output")
+    parser.add_argument('--db', help="also analyse every scrape in this result store's history")
+    parser.add_argument('--latest', action='store_true', help="keep only the newest record of each stay")
+    parser.add_argument('--parquet', metavar='PATH', help="write the per-night frame to this Parquet file")
+    parser.add_argument('--summary-csv', metavar='PATH', help="write the per-currency summary to this CSV")
+    args = parser.parse_args(argv)
+    if not args.results and not args.db:
+        parser.error("give result files and/or --db")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    frames = [load_results(args.results)] if args.results else []
+    if args.db:
+        frames.append(load_history(args.db))
+    analysed = analyse(pd.concat(frames, ignore_index=True), latest=args.latest)
+    summary = summarise(analysed)
+    print_report(analysed, summary)
+    if args.parquet:
+        analysed.to_parquet(args.parquet, index=False, compression='zstd')
+        print(f"🗜️  Wrote {len(analysed)} rows to {args.parquet}")
+    if args.summary_csv:
+        summary.to_csv(args.summary_csv)
+        print(f"📝 Wrote the summary to {args.summary_csv}")
+    return analysed, summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,621 @@
+import asyncio
+import re
+from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from airbnb_errors import (PHASE_RETRIES, NavigationTimeout, PriceNotFound, SelectorMissing, check_blocked,
+                           check_navigation)
+from airbnb_metrics import PhaseSpans
+from airbnb_parsing import analyse_snapshot, is_price_response, parse_booking_payload
+from airbnb_scraper import (
+    BASE_URL,
+    CALENDAR_MAX_MONTHS,
+    PHASE_BUDGETS,
+    PRICE_READY_JS,
+    SNAPSHOT_JS,
+    PoolState,
+    attach_debug_logging,
+    attempt_failed,
+    booking_price,
+    extract_room_id,
+    finish_listing,
+    first_sighting,
+    format_date_for_selection,
+    listing_stays,
+    load_storage_state,
+    plan_listing,
+    reconstruct_url,
+    record_http_answer,
+    retry_delay,
+    retry_in_phase,
+    write_storage_state,
+)
+from airbnb_http import HttpFetcher
+from airbnb_store import price_status
+
+class AsyncBrowserPool(PoolState):
+    """Async twin of BrowserPool: one Chromium, contexts shared by the workers"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.launch_lock = asyncio.Lock()
+
+    async def _ensure_browser(self):
+        async with self.launch_lock:
+            if not self.browser_alive():
+                print(f"🌍 Launching Chromium (headless={self.headless})...")
+                self._browser_launched(await self.playwright.chromium.launch(headless=self.headless))
+        return self.browser
+
+    async def _ensure_persistent(self):
+        async with self.launch_lock:
+            if self.persistent is None:
+                print(f"🌍 Launching Chromium on profile {self.profile_dir} (headless={self.headless})...")
+                self.persistent = await self.playwright.chromium.launch_persistent_context(
+                    self.profile_dir, headless=self.headless)
+                if self.route_policy:
+                    await self.persistent.route("**/*", self.route_policy.handle_async)
+                state = load_storage_state(self.storage_state)
+                if state and state.get('cookies'):
+                    await self.persistent.add_cookies(state['cookies'])
+                    self.warm_session = True
+        return self.persistent
+
+    async def acquire(self):
+        """Return a warm context, creating one if none is idle"""
+        if self.profile_dir:
+            return await self._ensure_persistent()
+        browser = await self._ensure_browser()
+        if self.idle_contexts:
+            return self._checkout(self.idle_contexts.pop())
+        state = load_storage_state(self.storage_state)
+        context = await browser.new_context(storage_state=state) if state else await browser.new_context()
+        if self.route_policy:
+            await context.route("**/*", self.route_policy.handle_async)
+        return self._checkout(context, state)
+
+    async def save_session(self, context):
+        if not self.storage_state:
+            return
+        try:
+            write_storage_state(self.storage_state, await context.storage_state())
+            self.session_saved = True
+        except Exception as e:
+            print(f"⚠️  Could not save session state: {e}")
+
+    async def release(self, context, crashed=False):
+        """Give a context back; recycle it after a crash or N uses"""
+        if self.profile_dir:
+            if crashed:
+                # Pages of other listings live in the same context, only drop it if it is dead
+                try:
+                    await context.cookies()
+                except:
+                    self._profile_crashed(context)
+            elif not self.session_saved:
+                await self.save_session(context)
+            return
+        save, keep = self._checkin(context, crashed)
+        if save:
+            await self.save_session(context)
+        if keep:
+            self.idle_contexts.append(context)
+            return
+        try:
+            await context.close()
+        except:
+            pass
+
+    async def close(self):
+        contexts = self._drain()
+        if contexts:
+            await self.save_session(contexts[0])
+        for context in contexts:
+            try:
+                await context.close()
+            except:
+                pass
+        if self.browser:
+            try:
+                await self.browser.close()
+            except:
+                pass
+            self.browser = None
+
+class AsyncPriceResponseWatcher:
+    """Async twin of PriceResponseWatcher"""
+
+    def __init__(self, page):
+        self.page = page
+        self.responses = []
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if is_price_response(response.url):
+            self.responses.append(response)
+
+    def mark(self):
+        return len(self.responses)
+
+    async def latest_booking(self, since=0):
+        for response in reversed(self.responses[since:]):
+            try:
+                booking = parse_booking_payload(await response.json())
+            except:
+                continue
+            if booking:
+                return booking
+        return None
+
+    async def wait_for_booking(self, timeout=PHASE_BUDGETS['response'], since=0):
+        """Return the parsed booking as soon as a price response arrives, or None"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout / 1000
+        booking = await self.latest_booking(since)
+        while not booking and loop.time() < deadline:
+            try:
+                await self.page.wait_for_event(
+                    "response",
+                    predicate=lambda response: is_price_response(response.url),
+                    timeout=(deadline - loop.time()) * 1000)
+            except:
+                return await self.latest_booking(since)
+            booking = await self.latest_booking(since)
+        return booking
+
+async def dismiss_popup_async(page, timeout):
+    """Async version of dismiss_popup, timeout=0 checks once without waiting"""
+    try:
+        close_button = page.get_by_role("button", name="Close").first
+        if timeout <= 0:
+            if not await close_button.is_visible():
+                return False
+        else:
+            await close_button.wait_for(state="visible", timeout=timeout)
+        await close_button.click()
+        return True
+    except:
+        return False
+
+async def show_calendar_day_async(calendar, formatted, max_months=CALENDAR_MAX_MONTHS):
+    """Async version of show_calendar_day"""
+    day = calendar.get_by_role("button", name=formatted)
+    for _ in range(max_months):
+        if await day.is_visible():
+            return day
+        await calendar.get_by_role("button", name="Move forward").click()
+    return day
+
+async def select_dates_async(page, check_in_date, check_out_date, budgets):
+    """Async version of select_dates"""
+    check_in_formatted = format_date_for_selection(check_in_date)
+    check_out_formatted = format_date_for_selection(check_out_date)
+    if not (check_in_formatted and check_out_formatted):
+        return False
+
+    date_button = page.get_by_role("button", name="Change dates").first
+    await date_button.wait_for(state="visible", timeout=budgets['dates'])
+    await date_button.click()
+
+    calendar = page.get_by_test_id("bookit-sidebar-availability-calendar")
+    await calendar.get_by_role("button", name="Move forward").wait_for(state="visible", timeout=budgets['calendar'])
+
+    for formatted in (check_in_formatted, check_out_formatted):
+        try:
+            day = await show_calendar_day_async(calendar, formatted)
+            await day.click(timeout=budgets['calendar'])
+        except:
+            print(f"⚠️  Could not find date: {formatted}")
+            return False
+
+    await page.get_by_role("button", name=re.compile(rf"Check-in: {check_in_date}.*{check_out_date}")).first.wait_for(
+        state="visible", timeout=budgets['dates'])
+    return True
+
+async def wait_for_price_async(page, watcher, budgets, since=0, snapshot=None):
+    """Async version of wait_for_price"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budgets['price'] / 1000
+    price_node_seen = False
+    while True:
+        booking = await watcher.latest_booking(since) if watcher else None
+        price = (booking['price'] if booking and booking['available']
+                 else await try_extract_price_async(page, snapshot))
+        snapshot = None  # only the first poll may reuse the caller's snapshot
+        if price:
+            return price
+
+        remaining = (deadline - loop.time()) * 1000
+        if remaining <= 0 or price_node_seen:
+            return None
+        await dismiss_popup_async(page, timeout=0)
+        try:
+            await page.wait_for_function(PRICE_READY_JS, timeout=remaining)
+            price_node_seen = True
+        except:
+            pass
+
+async def load_listing_async(page, url, budgets):
+    """Async version of load_listing"""
+    try:
+        response = await page.goto(url, timeout=budgets['goto'], wait_until='domcontentloaded')
+    except PlaywrightTimeoutError as e:
+        raise NavigationTimeout(str(e)) from e
+    check_navigation(response.status if response else None, page.url, extract_room_id(url))
+
+async def select_dates_with_retry_async(page, check_in_date, check_out_date, budgets):
+    """Async version of select_dates_with_retry"""
+    for phase_try in range(PHASE_RETRIES + 1):
+        try:
+            if await select_dates_async(page, check_in_date, check_out_date, budgets):
+                return True
+            error = SelectorMissing("calendar day not found")
+        except Exception as e:
+            error = e
+        retry_in_phase(error, "setting dates")
+        if phase_try < PHASE_RETRIES:
+            await page.keyboard.press("Escape")
+            await dismiss_popup_async(page, budgets['popup_retry'])
+    return False
+
+async def scrape_attempt_async(page, pool, url, check_in_date, check_out_date, attempt, watcher, budgets, spans):
+    """Async version of scrape_attempt"""
+    with spans.span('goto', url, attempt):
+        await load_listing_async(page, url, budgets)
+
+    # The URL already carries the dates, so the first booking response is enough
+    if watcher:
+        with spans.span('response', url, attempt) as span:
+            booking = await watcher.wait_for_booking(budgets['response'])
+            price = booking_price(booking)
+            span['outcome'] = price_status(price) if booking else 'absent'
+        if price == "Not Available":
+            print(f"🚫 Booking API says dates are not available: {url}")
+            return price
+        if price:
+            print(f"✅ Price from booking API: {price} ({booking['nights']} nights)")
+            return price
+        print(f"⚠️  No booking API response, falling back to page scraping: {url}")
+
+    # Wait for network to be calm, but never longer than the budget
+    with spans.span('settle', url, attempt) as span:
+        try:
+            await page.wait_for_load_state('networkidle', timeout=budgets['settle'])
+            print(f"✅ Network settled: {url}")
+        except:
+            span['outcome'] = 'timeout'
+            print(f"⚠️  Network didn't settle within budget, proceeding anyway: {url}")
+
+    with spans.span('popup', url, attempt) as span:
+        found = await dismiss_popup_async(page, pool.popup_budget(budgets))
+        pool.note_popup(found)
+        if not found:
+            span['outcome'] = 'absent'
+
+    # If dates are provided, try to set them; the URL carries them anyway
+    if check_in_date and check_out_date:
+        with spans.span('dates', url, attempt) as span:
+            if not await select_dates_with_retry_async(page, check_in_date, check_out_date, budgets):
+                span['outcome'] = 'failed'
+
+    with spans.span('availability', url, attempt) as span:
+        snapshot = await take_snapshot_async(page)
+        check_blocked(snapshot.get('body'))
+        is_available = await check_availability_async(page, snapshot)
+        if not is_available:
+            span['outcome'] = 'not_available'
+    if not is_available:
+        print(f"🚫 Room not available - returning 'Not Available': {url}")
+        return "Not Available"
+
+    with spans.span('price', url, attempt) as span:
+        for phase_try in range(PHASE_RETRIES + 1):
+            price = await wait_for_price_async(page, watcher, budgets, snapshot=snapshot)
+            if price:
+                break
+            snapshot = None
+            if phase_try < PHASE_RETRIES:
+                await dismiss_popup_async(page, budgets['popup_retry'])
+        if not price:
+            span['outcome'] = 'absent'
+    if not price:
+        raise PriceNotFound("Price not found within budget")
+    print(f"✅ Price found: {price}")
+    return price
+
+async def scrape_airbnb_price_async(url, check_in_date, check_out_date, pool, max_retries=3, limiter=None,
+                                    extract_mode='network', budgets=None, spans=None, breaker=None):
+    """Async version of scrape_airbnb_price, same steps and return values"""
+    budgets = {**PHASE_BUDGETS, **(budgets or {})}
+    spans = spans or PhaseSpans()
+    for attempt in range(1, max_retries + 1):
+        if breaker:
+            await wait_for_breaker(breaker)
+        context = page = None
+        crashed = False
+
+        try:
+            # A dead context fails here; like any crash it is recycled and the attempt retried
+            with spans.span('launch', url, attempt):
+                context = await pool.acquire()
+                page = await context.new_page()
+            print(f"🚀 Attempt {attempt}/{max_retries}: Opening URL: {url}")
+            attach_debug_logging(page)
+            watcher = AsyncPriceResponseWatcher(page) if extract_mode == 'network' else None
+
+            if limiter:
+                delay = limiter.reserve(url)
+                if delay > 0:
+                    print(f"⏳ Rate limit: waiting {delay:.1f}s before loading {url}")
+                    await asyncio.sleep(delay)
+
+            price = await scrape_attempt_async(page, pool, url, check_in_date, check_out_date, attempt, watcher,
+                                               budgets, spans)
+            if breaker:
+                breaker.record()
+            return price
+
+        except Exception as e:
+            crashed = True
+            if not attempt_failed(e, f"Attempt {attempt}", url, breaker):
+                return None
+            wait_time = retry_delay(attempt, max_retries, budgets, limiter)
+            if wait_time is None:
+                print(f"❌ All {max_retries} attempts failed for {url}")
+                return None
+            if wait_time:
+                await asyncio.sleep(wait_time)
+        finally:
+            with spans.span('teardown', url, attempt):
+                try:
+                    if page:
+                        await page.close()
+                except:
+                    pass
+                if context:
+                    await pool.release(context, crashed)
+
+    return None
+
+async def wait_for_breaker(breaker):
+    """Async version of CircuitBreaker.wait"""
+    delay = breaker.pause_for()
+    if delay > 0:
+        print(f"🔌 Circuit breaker open, waiting {delay:.0f}s...")
+        await asyncio.sleep(delay)
+
+async def read_stay_price_async(page, watcher, since, budgets):
+    """Async version of read_stay_price"""
+    if watcher:
+        price = booking_price(await watcher.wait_for_booking(budgets['response'], since))
+        if price:
+            return price
+    snapshot = await take_snapshot_async(page)
+    check_blocked(snapshot.get('body'))
+    if not await check_availability_async(page, snapshot):
+        return "Not Available"
+    return await wait_for_price_async(page, watcher, budgets, since, snapshot)
+
+async def sweep_airbnb_prices_async(room_id, stays, pool, max_retries=3, limiter=None, extract_mode='network',
+                                    budgets=None, spans=None, breaker=None, base_url=BASE_URL):
+    """Async version of sweep_airbnb_prices"""
+    budgets = {**PHASE_BUDGETS, **(budgets or {})}
+    spans = spans or PhaseSpans()
+    prices = {stay: None for stay in stays}
+
+    for attempt in range(1, max_retries + 1):
+        todo = [stay for stay in stays if prices[stay] is None]
+        if not todo:
+            break
+
+        url = reconstruct_url(room_id, *todo[0], base_url=base_url)
+        if breaker:
+            await wait_for_breaker(breaker)
+        context = page = None
+        crashed = False
+        try:
+            with spans.span('launch', url, attempt):
+                context = await pool.acquire()
+                page = await context.new_page()
+            watcher = AsyncPriceResponseWatcher(page) if extract_mode == 'network' else None
+            if limiter:
+                delay = limiter.reserve(url)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            with spans.span('goto', url, attempt):
+                await load_listing_async(page, url, budgets)
+
+            for index, (check_in, check_out) in enumerate(todo):
+                since = watcher.mark() if watcher and index > 0 else 0
+                if index > 0:
+                    if index == 1:
+                        with spans.span('popup', url, attempt) as span:
+                            found = await dismiss_popup_async(page, pool.popup_budget(budgets))
+                            pool.note_popup(found)
+                            if not found:
+                                span['outcome'] = 'absent'
+                    with spans.span('dates', url, attempt, check_in=check_in, check_out=check_out) as span:
+                        selected = await select_dates_with_retry_async(page, check_in, check_out, budgets)
+                        if not selected:
+                            print(f"⚠️  Could not select {check_in} to {check_out} for room {room_id}")
+                            span['outcome'] = 'failed'
+                    if not selected:
+                        continue
+                with spans.span('price', url, attempt, check_in=check_in, check_out=check_out) as span:
+                    price = await read_stay_price_async(page, watcher, since, budgets)
+                    span['outcome'] = price_status(price)
+                prices[(check_in, check_out)] = price
+            if breaker:
+                breaker.record()
+        except Exception as e:
+            crashed = True
+            if not attempt_failed(e, f"Sweep attempt {attempt}", f"room {room_id}", breaker):
+                break
+        finally:
+            with spans.span('teardown', url, attempt):
+                try:
+                    if page:
+                        await page.close()
+                except:
+                    pass
+                if context:
+                    await pool.release(context, crashed)
+
+    return prices
+
+async def take_snapshot_async(page):
+    """Async version of take_snapshot"""
+    return await page.evaluate(SNAPSHOT_JS)
+
+async def check_availability_async(page, snapshot=None):
+    """Async version of check_availability"""
+    try:
+        available, indicator, _ = analyse_snapshot(snapshot or await take_snapshot_async(page))
+        if not available:
+            print(f"🚫 Room appears unavailable (found: {indicator})")
+        return available
+
+    except Exception as e:
+        print(f"⚠️  Could not check availability: {e}")
+        return True  # Assume available if we can't check
+
+async def try_extract_price_async(page, snapshot=None):
+    """Async version of try_extract_price"""
+    try:
+        _, _, price = analyse_snapshot(snapshot or await take_snapshot_async(page))
+    except:
+        return None
+    return price
+
+async def http_tier_async(fetcher, row_num, room_id, todo, known, stats, store, limiter=None, base_url=BASE_URL):
+    """Async version of http_tier, the GETs run on a thread"""
+    left = []
+    for stay in todo:
+        if not fetcher.enabled:
+            left.append(stay)
+            continue
+        url = reconstruct_url(room_id, *stay, base_url=base_url)
+        if limiter:
+            delay = limiter.reserve(url)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        stats['http_requests'] += 1
+        price = await asyncio.to_thread(fetcher.fetch_price, url)
+        if price:
+            record_http_answer(row_num, room_id, stay, price, url, known, stats, store)
+        else:
+            left.append(stay)
+    return left
+
+async def scrape_listings_async(listings, check_in, check_out, stats, args, limiter, route_policy=None,
+                                store=None, spans=None, breaker=None):
+    """Scrape listings with `args.concurrency` workers sharing one browser, yielding results as they finish"""
+    queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    results = asyncio.Queue()
+    fetcher = HttpFetcher() if args.http_tier else None
+
+    async with async_playwright() as playwright:
+        pool = AsyncBrowserPool(playwright, headless=args.headless, max_context_uses=args.context_uses,
+                                route_policy=route_policy, storage_state=args.storage_state,
+                                profile_dir=args.profile_dir)
+
+        async def feed():
+            # The CSV (or a producer like the search crawler) is read lazily so the queue applies back-pressure
+            try:
+                if hasattr(listings, '__aiter__'):
+                    async for item in listings:
+                        await queue.put(item)
+                else:
+                    for item in listings:
+                        await queue.put(item)
+            finally:
+                # Also when the producer raised, so the workers drain the queue and stop
+                for _ in range(args.concurrency):
+                    await queue.put(None)
+
+        async def worker(worker_id):
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    row_num, room_id, original_url, row = item
+                    start_time = asyncio.get_running_loop().time()
+                    stays = listing_stays(original_url, check_in, check_out, args)
+                    known, todo = plan_listing(row_num, room_id, original_url, row, stays, stats, args, store)
+                    if fetcher:
+                        todo = await http_tier_async(fetcher, row_num, room_id, todo, known, stats, store, limiter,
+                                                     args.base_url)
+                    if not todo:
+                        stats['browserless'] += 1
+
+                    prices = {}
+                    try:
+                        if len(todo) == 1:
+                            url_to_scrape = reconstruct_url(room_id, *todo[0], base_url=args.base_url)
+                            print(f"🎯 Worker {worker_id} scraping row {row_num}: {url_to_scrape}")
+                            prices[todo[0]] = await scrape_airbnb_price_async(
+                                url_to_scrape, *todo[0], pool, limiter=limiter,
+                                extract_mode=args.extract, budgets=args.budgets, spans=spans,
+                                breaker=breaker)
+                        elif todo:
+                            print(f"🧹 Worker {worker_id} sweeping row {row_num}: {len(todo)} stays")
+                            prices = await sweep_airbnb_prices_async(room_id, todo, pool, limiter=limiter,
+                                                                     extract_mode=args.extract,
+                                                                     budgets=args.budgets, spans=spans,
+                                                                     breaker=breaker, base_url=args.base_url)
+                    except Exception as e:
+                        print(f"❌ Worker {worker_id} crashed on row {row_num}: {e}")
+
+                    for result in finish_listing(row_num, room_id, stays, known, prices, stats, store,
+                                                 args.base_url):
+                        result['elapsed'] = round(asyncio.get_running_loop().time() - start_time, 3)
+                        await results.put(result)
+            finally:
+                # Tell the consumer this worker is done, even if it died
+                await results.put(None)
+
+        feeder = asyncio.create_task(feed())
+        workers = [asyncio.create_task(worker(i + 1)) for i in range(args.concurrency)]
+        tasks = [feeder] + workers
+        try:
+            finished = 0
+            while finished < args.concurrency:
+                result = await results.get()
+                if result is None:
+                    finished += 1
+                    continue
+                yield result
+            if not feeder.done():
+                # Every worker died while the producer still had listings; empty the queue
+                # so the cancelled feed can put its end markers without blocking
+                while not queue.empty():
+                    queue.get_nowait()
+                feeder.cancel()
+            await asyncio.wait(tasks)
+            # A worker's crash comes first, it is why a still-running producer was cancelled
+            for task in workers + [feeder]:
+                if not task.cancelled() and task.exception():
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await pool.close()
+            if fetcher:
+                fetcher.close()
+
+    # Keep the summary in CSV order regardless of completion order
+    if stats['prices_found']:
+        stats['prices_found'].sort(key=lambda item: item['row'])
+
+async def dedupe_listings_async(listings, stats):
+    """Async version of dedupe_listings, for listings streamed by a producer"""
+    first_rows = {}
+    async for row_num, room_id, original_url, row in listings:
+        if first_sighting(first_rows, row_num, room_id, original_url, stats):
+            yield row_num, room_id, original_url, row
+
+async def write_results_async(results, writer):
+    """Drain an async result stream into a ResultWriter"""
+    async for result in results:
+        writer.write(result)
@@ -0,0 +1,391 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import airbnb_scraper
+from airbnb_supervisor import orphaned_browsers, process_tree_rss
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RESULTS_FILE = 'bench_results.jsonl'
+
+# Scraper options per benchmarked mode, on top of the common bench options
+MODES = {
+    'sync': [],
+    'browser': ['--no-http'],
+    'async': ['--async'],
+    'dom': ['--extract', 'dom'],
+    'async-dom': ['--async', '--extract', 'dom'],
+    'no-block': ['--no-block'],
+    'sharded': ['--workers', '4'],
+    'seed': ['--seed-prices', '--dates-from-url'],
+}
+
+SOAK_SAMPLE_SECONDS = 10
+SOAK_WARMUP = 0.1           # share of the soak samples left out of the memory slope
+SOAK_MAX_GROWTH_MB_H = 20   # memory growth per hour a soak still counts as flat
+
+IMAGE_BYTES = 150_000  # size of each stand-in listing photo
+UNAVAILABLE_EVERY = 7  # every Nth room is booked for any stay
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as file:
+        return file.read()
+
+def room_nightly_price(room_id):
+    """Deterministic nightly price in zł for a stand-in room"""
+    return 150 + zlib.crc32(room_id.encode()) % 300
+
+def booking_payload(room_id, check_in, check_out):
+    """StaysPdpSections response for a stand-in room, shaped like the recorded fixtures"""
+    unavailable = zlib.crc32(room_id.encode()) % UNAVAILABLE_EVERY == 0
+    payload = json.loads(_load_fixture('stays_pdp_sections_unavailable.json' if unavailable
+                                       else 'stays_pdp_sections_available.json'))
+    if unavailable:
+        return payload
+    nights = (date.fromisoformat(check_out) - date.fromisoformat(check_in)).days
+    total = f"{room_nightly_price(room_id) * nights:,}".replace(',', ' ') + " zł"
+    for section in payload['data']['presentation']['stayProductDetailPage']['sections']['sections']:
+        if section['sectionId'] == 'BOOK_IT_SIDEBAR':
+            section['section']['structuredDisplayPrice']['primaryLine'].update({
+                'price': total,
+                'qualifier': f"for {nights} nights",
+                'accessibilityLabel': f"{total} for {nights} nights",
+            })
+    return payload
+
+class StandInServer(ThreadingHTTPServer):
+    """Local HTTP server that answers like airbnb.com for listing pages"""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, failure_rate=0.0, popup_delay=300, bootstrap=True, seed=0):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.popup_delay = popup_delay
+        self.bootstrap = bootstrap  # embed the booking state in the page HTML, like airbnb.com does
+        self.random = random.Random(seed)
+        self.template = _load_fixture('bench_listing.html')
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes: /rooms/<id>, /api/v3/StaysPdpSections, /im/ photos, fonts and tracking beacons"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.requests += 1
+        self._send(204, 'text/plain', b'')
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        # Injected latency with +-50% jitter, and random failures on pages and API calls
+        if server.latency:
+            time.sleep(server.latency * server.random.uniform(0.5, 1.5))
+        if url.path.startswith(('/rooms/', '/api/')) and server.random.random() < server.failure_rate:
+            self._send(503, 'text/plain', b'injected failure')
+            return
+
+        if url.path.startswith('/rooms/'):
+            room_id = url.path.split('/')[2]
+            bootstrap = {}
+            if server.bootstrap and 'check_in' in query and 'check_out' in query:
+                bootstrap = booking_payload(room_id, query['check_in'], query['check_out'])
+            html = (server.template.replace('{room_id}', room_id)
+                    .replace('{popup_delay}', str(server.popup_delay))
+                    .replace('{bootstrap}', json.dumps(bootstrap, ensure_ascii=False).replace('</', '<\\/')))
+            self._send(200, 'text/html; charset=utf-8', html.encode())
+        elif url.path.startswith('/api/v3/StaysPdpSections'):
+            payload = booking_payload(query['room'], query['check_in'], query['check_out'])
+            self._send(200, 'application/json', json.dumps(payload, ensure_ascii=False).encode())
+        elif url.path.startswith('/im/'):
+            self._send(200, 'image/jpeg', b'\0' * IMAGE_BYTES)
+        elif url.path.startswith('/static/'):
+            self._send(200, 'text/css', b'body { font-family: sans-serif; }')
+        else:
+            self._send(404, 'text/plain', b'not found')
+
+def write_seed_csv(path, listings, check_in, check_out):
+    """Seed CSV in the export's layout with `listings` distinct rooms quoting the stay"""
+    nights = (date.fromisoformat(check_out) - date.fromisoformat(check_in)).days
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        file.write('"l1ovpqvx href","a8jt5op","s1bvye8w"\n')
+        for i in range(listings):
+            room_id = str(900000000 + i)
+            total = f"{room_nightly_price(room_id) * nights:,}".replace(',', ' ')
+            file.write(f'"https://www.airbnb.com/rooms/{room_id}?adults=1&check_in={check_in}'
+                       f'&check_out={check_out}&source_impression_id=bench","Guest favorite",'
+                       f'"{total} zł for {nights} nights"\n')
+
+class RssSampler(threading.Thread):
+    """Track the peak RSS of the process tree while a run is going"""
+
+    def __init__(self, interval=0.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, process_tree_rss())
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        if not self.peak:  # no /proc, fall back to this process only (KiB on Linux)
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return self.peak
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(FIXTURES)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_mode(mode, server, seed_csv, workdir, bench_args):
+    """Run the scraper pipeline once in `mode` against the stand-in server and measure it"""
+    output = os.path.join(workdir, f'{mode}.jsonl')
+    argv = ['--csv', seed_csv, '--base-url', server.base_url, '--db', os.path.join(workdir, f'{mode}.sqlite'),
+            '--ttl', '0', '--rpm', '1000000', '--concurrency', str(bench_args.concurrency),
+            '--check-in', bench_args.check_in, '--check-out', bench_args.check_out,
+            '--output', output] + MODES[mode]
+    args = airbnb_scraper.parse_args(argv)
+
+    sampler = RssSampler()
+    sampler.start()
+    start = time.monotonic()
+    quiet = contextlib.nullcontext() if bench_args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        stats = airbnb_scraper.run(args)
+    wall = time.monotonic() - start
+    peak_rss = sampler.stop()
+
+    with open(output, 'r', encoding='utf-8') as file:
+        results = [json.loads(line) for line in file]
+    latencies = [result['elapsed'] for result in results if result['elapsed'] is not None]
+    return {
+        'mode': mode,
+        'listings': len(results),
+        'prices': stats['successful_prices'],
+        'not_available': stats['not_available'],
+        'failed': stats['failed_scrapes'],
+        'wall_s': round(wall, 2),
+        'listings_per_min': round(len(results) / wall * 60, 1) if wall else None,
+        'p50_s': percentile(latencies, 0.50),
+        'p95_s': percentile(latencies, 0.95),
+        'peak_rss_mb': round(peak_rss / 1_000_000, 1),
+        'blocked_requests': stats.get('routing', {}).get('blocked_requests'),
+    }
+
+def growth_per_hour(samples):
+    """Least-squares slope in MB/hour of (seconds, bytes) samples"""
+    if len(samples) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in samples) / len(samples)
+    mean_m = sum(m for _, m in samples) / len(samples)
+    spread = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not spread:
+        return 0.0
+    slope = sum((t - mean_t) * (m - mean_m) for t, m in samples) / spread
+    return slope * 3600 / 1_000_000
+
+def soak(server, workdir, bench_args):
+    """Run the scraper in --long-run mode against the stand-in server and judge its memory profile
+
+    The scraper runs as its own process group for --soak minutes over a seed
+    CSV too large to finish, and the RSS of its whole tree (supervisor, run,
+    Playwright and Chromium) is sampled as it goes. The run passes when the
+    memory slope after warm-up stays under SOAK_MAX_GROWTH_MB_H and no
+    Chromium is left behind once it is stopped.
+    """
+    seed_csv = os.path.join(workdir, 'soak.csv')
+    write_seed_csv(seed_csv, bench_args.soak_listings, bench_args.check_in, bench_args.check_out)
+    output = os.path.join(workdir, 'soak.jsonl')
+    argv = [sys.executable, os.path.abspath(airbnb_scraper.__file__), '--long-run',
+            '--csv', seed_csv, '--base-url', server.base_url, '--db', os.path.join(workdir, 'soak.sqlite'),
+            '--ttl', '0', '--rpm', '1000000', '--check-in', bench_args.check_in,
+            '--check-out', bench_args.check_out, '--output', output] + bench_args.soak_args.split()
+    print(f"🫧 Soaking for {bench_args.soak:g} minutes: {' '.join(argv[2:])}")
+
+    with open(os.path.join(workdir, 'soak.log'), 'w', encoding='utf-8') as log:
+        process = subprocess.Popen(argv, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    samples = []
+    listings = 0
+    start = time.monotonic()
+    deadline = start + bench_args.soak * 60
+    try:
+        while not os.path.exists(output) and process.poll() is None:
+            time.sleep(0.1)
+        with open(output, 'r', encoding='utf-8') as results:
+            while time.monotonic() < deadline and process.poll() is None:
+                time.sleep(min(SOAK_SAMPLE_SECONDS, max(0, deadline - time.monotonic())))
+                listings += sum(1 for _ in results)
+                elapsed = time.monotonic() - start
+                rss = process_tree_rss(process.pid)
+                samples.append((elapsed, rss))
+                print(f"   {elapsed / 60:6.1f} min  {rss / 1_000_000:7.1f} MB  {listings} listings")
+    finally:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGINT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+    leftovers = orphaned_browsers()
+
+    steady = samples[int(len(samples) * SOAK_WARMUP):]
+    growth = growth_per_hour(steady)
+    wall = time.monotonic() - start
+    return {
+        'mode': 'soak',
+        'minutes': round(wall / 60, 1),
+        'listings': listings,
+        'listings_per_min': round(listings / wall * 60, 1) if wall else None,
+        'start_rss_mb': round(steady[0][1] / 1_000_000, 1) if steady else None,
+        'end_rss_mb': round(steady[-1][1] / 1_000_000, 1) if steady else None,
+        'peak_rss_mb': round(max(rss for _, rss in samples) / 1_000_000, 1) if samples else None,
+        'growth_mb_per_hour': round(growth, 1),
+        'orphaned_chromium': len(leftovers),
+        'exit_code': process.returncode,
+        'flat': growth <= SOAK_MAX_GROWTH_MB_H and not leftovers,
+    }
+
+def print_soak_report(record):
+    print(f"{'✅' if record['flat'] else '❌'} Soak: {record['listings']} listings in {record['minutes']} min "
+          f"({record['listings_per_min']} listings/min), RSS {record['start_rss_mb']} → {record['end_rss_mb']} MB "
+          f"(peak {record['peak_rss_mb']} MB), {record['growth_mb_per_hour']:+} MB/hour, "
+          f"{record['orphaned_chromium']} orphaned Chromium processes")
+
+def previous_run(results_file, record):
+    """Last stored run with the same mode and knobs, for comparison"""
+    keys = ('mode', 'listings_requested', 'latency_ms', 'failure_rate', 'concurrency')
+    previous = None
+    try:
+        with open(results_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                old = json.loads(line)
+                if all(old.get(key) == record.get(key) for key in keys):
+                    previous = old
+    except FileNotFoundError:
+        pass
+    return previous
+
+def print_report(record, previous):
+    def seconds(value):
+        return f"{value:.2f}s" if value is not None else "n/a"
+
+    line = (f"{record['mode']:>10}: {record['listings_per_min']} listings/min, "
+            f"p50 {seconds(record['p50_s'])}, p95 {seconds(record['p95_s'])}, peak RSS {record['peak_rss_mb']} MB, "
+            f"{record['prices']} prices / {record['not_available']} unavailable / {record['failed']} failed")
+    print(line)
+    if previous:
+        change = (record['listings_per_min'] - previous['listings_per_min']) / previous['listings_per_min'] * 100 \
+            if previous['listings_per_min'] else 0
+        print(f"{'':>10}  vs {previous.get('revision') or 'previous run'}: "
+              f"{previous['listings_per_min']} listings/min ({change:+.0f}%), "
+              f"p95 {seconds(previous['p95_s'])}, peak RSS {previous['peak_rss_mb']} MB")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local stand-in listing server")
+    parser.add_argument('--modes', default='sync,async', help=f"comma separated, from: {', '.join(MODES)}")
+    parser.add_argument('--listings', type=int, default=20, help="distinct rooms in the generated seed CSV")
+    parser.add_argument('--latency', type=float, default=50, help="injected latency per request in ms")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="fraction of page and API requests answered with 503")
+    parser.add_argument('--popup-delay', type=int, default=300, help="ms before the listing popup appears")
+    parser.add_argument('--concurrency', type=int, default=airbnb_scraper.DEFAULT_CONCURRENCY)
+    parser.add_argument('--check-in', default='2025-11-23')
+    parser.add_argument('--check-out', default='2025-11-28')
+    parser.add_argument('--results', default=RESULTS_FILE, help="JSONL file runs are appended to")
+    parser.add_argument('--verbose', action='store_true', help="show the scraper's own output")
+    parser.add_argument('--soak', type=float, metavar='MINUTES',
+                        help="instead of the modes, soak-test --long-run for this long and report memory growth")
+    parser.add_argument('--soak-listings', type=int, default=100_000, help="rooms in the soak seed CSV")
+    parser.add_argument('--soak-args', default='', help="extra scraper options for the soak, e.g. '--no-http'")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        raise SystemExit(f"unknown modes: {', '.join(unknown)}")
+
+    server = StandInServer(latency=args.latency / 1000, failure_rate=args.failure_rate,
+                           popup_delay=args.popup_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    revision = git_revision()
+    print(f"🏁 Stand-in server on {server.base_url}, {args.listings} listings, "
+          f"{args.latency:g} ms latency, {args.failure_rate:.0%} failures")
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            if args.soak:
+                record = soak(server, workdir, args)
+                record.update({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'revision': revision,
+                               'latency_ms': args.latency, 'failure_rate': args.failure_rate})
+                print_soak_report(record)
+                with open(args.results, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(record) + "\n")
+                return
+            seed_csv = os.path.join(workdir, 'seed.csv')
+            write_seed_csv(seed_csv, args.listings, args.check_in, args.check_out)
+            for mode in modes:
+                record = run_mode(mode, server, seed_csv, workdir, args)
+                record.update({
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'revision': revision,
+                    'listings_requested': args.listings,
+                    'latency_ms': args.latency,
+                    'failure_rate': args.failure_rate,
+                    'concurrency': args.concurrency,
+                })
+                print_report(record, previous_run(args.results, record))
+                with open(args.results, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(record) + "\n")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import time
+from collections import deque
+
+# The async API raises the same class
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+# What to do after each class of failure
+RETRY_PHASE = 'retry_phase'      # run the failed phase again on the live page
+FRESH_CONTEXT = 'fresh_context'  # drop the page and context, start again from goto
+FAIL_FAST = 'fail_fast'          # give up on the listing without retrying
+
+POLICIES = {
+    'nav_timeout': FRESH_CONTEXT,
+    'blocked': FAIL_FAST,
+    'selector_missing': RETRY_PHASE,
+    'price_not_found': RETRY_PHASE,
+    'listing_gone': FAIL_FAST,
+    'other': FRESH_CONTEXT,
+}
+
+PHASE_RETRIES = 1  # extra tries of a RETRY_PHASE phase before the attempt counts as failed
+
+# Page text served instead of the listing when Airbnb suspects a bot, checked case-insensitively
+BLOCKED_INDICATORS = (
+    "captcha",
+    "verify you are a human",
+    "unusual traffic",
+    "access denied",
+    "request blocked",
+)
+
+BLOCKED_STATUSES = (403, 429)
+GONE_STATUSES = (404, 410)
+
+class ScrapeError(Exception):
+    """A classified scrape failure; `kind` selects the policy in POLICIES"""
+    kind = 'other'
+
+class NavigationTimeout(ScrapeError):
+    kind = 'nav_timeout'
+
+class BlockedError(ScrapeError):
+    kind = 'blocked'
+
+class SelectorMissing(ScrapeError):
+    kind = 'selector_missing'
+
+class PriceNotFound(ScrapeError):
+    kind = 'price_not_found'
+
+class ListingGone(ScrapeError):
+    kind = 'listing_gone'
+
+def classify(error):
+    """Failure class of an exception raised while scraping a listing"""
+    if isinstance(error, ScrapeError):
+        return error.kind
+    if isinstance(error, PlaywrightTimeoutError):
+        # A locator or wait ran out outside navigation; the builtin TimeoutError (sockets) is not one
+        return 'selector_missing'
+    return 'other'
+
+def check_navigation(status, final_url, room_id=None):
+    """Raise BlockedError or ListingGone for a page load that did not land on the listing
+
+    `status` is the HTTP status of the main document (None if unknown) and
+    `final_url` the URL the page ended up on after redirects.
+    """
+    if status in BLOCKED_STATUSES:
+        raise BlockedError(f"HTTP {status} loading listing")
+    if status in GONE_STATUSES:
+        raise ListingGone(f"HTTP {status} loading listing")
+    if status and status >= 500:
+        # Server trouble is transient, handle it like a load that timed out
+        raise NavigationTimeout(f"HTTP {status} loading listing")
+    if room_id and f"/rooms/{room_id}" not in (final_url or ''):
+        raise ListingGone(f"redirected to {final_url}")
+
+def check_blocked(text):
+    """Raise BlockedError if page text looks like a bot challenge"""
+    lowered = (text or '').lower()
+    for indicator in BLOCKED_INDICATORS:
+        if indicator in lowered:
+            raise BlockedError(f"bot challenge on page ({indicator!r})")
+
+class CircuitBreaker:
+    """Pause the whole run when too many recent scrapes fail
+
+    Outcomes of the last `window` scrape attempts are kept; once at least
+    `min_samples` are in and the failure share reaches `threshold`, the
+    breaker opens for `cooldown` seconds, doubling on every consecutive
+    trip up to `max_cooldown`; threshold=0 never opens it. Listings that
+    are gone are not counted, they say nothing about the health of the run.
+    """
+
+    def __init__(self, window=20, threshold=0.5, min_samples=6, cooldown=60, max_cooldown=600):
+        self.outcomes = deque(maxlen=window)
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.trips = 0
+        self.consecutive_trips = 0
+        self.open_until = 0.0
+        self.counts = {}  # failure kind -> count
+
+    def record(self, kind=None):
+        """Record one attempt; kind is None on success, else a classify() result"""
+        if kind:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+        if kind == 'listing_gone':
+            return
+        self.outcomes.append(kind is not None)
+        if kind is None:
+            self.consecutive_trips = 0
+            return
+        failures = sum(self.outcomes)
+        if (self.threshold and len(self.outcomes) >= self.min_samples
+                and failures / len(self.outcomes) >= self.threshold):
+            pause = min(self.max_cooldown, self.cooldown * 2 ** self.consecutive_trips)
+            self.open_until = time.monotonic() + pause
+            self.trips += 1
+            self.consecutive_trips += 1
+            self.outcomes.clear()
+            print(f"🔌 Circuit breaker open: {failures} recent failures, last {kind}; pausing {pause:.0f}s")
+
+    def pause_for(self):
+        """Seconds left before the breaker lets the next page load through"""
+        return max(0.0, self.open_until - time.monotonic())
+
+    def wait(self):
+        delay = self.pause_for()
+        if delay > 0:
+            print(f"🔌 Circuit breaker open, waiting {delay:.0f}s...")
+            time.sleep(delay)
+
+    def counters(self):
+        return {'trips': self.trips, 'failures': dict(self.counts)}
@@ -0,0 +1,110 @@
+import gzip
+import http.client
+import threading
+import zlib
+from urllib.parse import urlparse
+
+from airbnb_parsing import parse_bootstrap_html
+
+# Headers of a desktop Chrome, without them the page comes back as a bare shell
+HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                   'Chrome/126.0.0.0 Safari/537.36'),
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+DEFAULT_TIMEOUT = 10  # seconds per request
+MAX_MISSES = 20       # consecutive misses after which the tier is switched off for the run
+
+class HttpFetcher:
+    """Plain HTTP GETs of listing pages over pooled keep-alive connections
+
+    fetch_price() reads the booking state bootstrapped into the listing
+    HTML and returns a Price, "Not Available", or None when the page did
+    not carry it and the browser has to take over. Safe to share between
+    threads; after MAX_MISSES misses in a row it stops trying.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_misses=MAX_MISSES):
+        self.timeout = timeout
+        self.max_misses = max_misses
+        self.idle = {}  # (scheme, netloc) -> [connection, ...]
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.misses_in_row = 0
+
+    @property
+    def enabled(self):
+        return self.misses_in_row < self.max_misses
+
+    def _connection(self, scheme, netloc):
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _give_back(self, scheme, netloc, connection):
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(connection)
+
+    def get(self, url):
+        """GET a URL and return (status, decoded body); a stale pooled connection is retried once"""
+        parsed = urlparse(url)
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else '')
+        for retry in range(2):
+            connection = self._connection(parsed.scheme, parsed.netloc)
+            try:
+                connection.request('GET', path, headers=HEADERS)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                # Also socket timeouts, which would leave a half-read response on a reused connection
+                connection.close()
+                if retry:
+                    raise
+                continue
+            if response.will_close:
+                connection.close()
+            else:
+                self._give_back(parsed.scheme, parsed.netloc, connection)
+            encoding = response.getheader('Content-Encoding', '')
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'deflate':
+                body = zlib.decompress(body)
+            return response.status, body.decode('utf-8', errors='replace')
+
+    def fetch_price(self, url):
+        """Price or "Not Available" from the listing's bootstrapped state, or None to fall back"""
+        if not self.enabled:
+            return None
+        self.requests += 1
+        try:
+            status, html = self.get(url)
+        except (http.client.HTTPException, OSError, EOFError, zlib.error) as e:
+            # EOFError and zlib.error come from truncated or corrupt compressed bodies
+            print(f"⚠️  HTTP tier request failed: {e!r}")
+            status, html = None, ''
+        booking = parse_bootstrap_html(html) if status == 200 else None
+        if not booking:
+            self.misses_in_row += 1
+            if not self.enabled:
+                print(f"🪶 HTTP tier missed {self.max_misses} listings in a row, using the browser only from now on")
+            return None
+        self.hits += 1
+        self.misses_in_row = 0
+        return booking['price'] if booking['available'] else "Not Available"
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle = {}
@@ -0,0 +1,124 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Phases of one scrape attempt, in the order they run
+PHASES = ('launch', 'goto', 'response', 'settle', 'popup', 'dates', 'availability', 'price', 'teardown')
+
+# Upper bounds in seconds of the latency histogram buckets
+HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+METRIC_NAME = 'airbnb_phase_seconds'
+
+def _bucket_label(bound):
+    return '+Inf' if bound == float('inf') else f'{bound:g}'
+
+class PhaseSpans:
+    """Time each phase of a scrape and keep per-phase latency histograms
+
+    Use `with spans.span('goto', url=url, attempt=2) as span:` around a
+    phase. The span's outcome is 'ok' unless the block raises ('error')
+    or sets span['outcome'] itself, e.g. to 'timeout' or 'absent' when a
+    swallowed wait ran out. With a path, every finished span is appended
+    to that JSONL file as it ends. With a `window`, only the latest that
+    many durations per phase are kept, so memory stays flat on long runs.
+    """
+
+    def __init__(self, path=None, window=None):
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+        self.window = window
+        self.durations = {}  # phase -> [seconds, ...]
+        self.outcomes = {}   # (phase, outcome) -> count
+
+    @contextmanager
+    def span(self, phase, url=None, attempt=None, **fields):
+        span = {'phase': phase, 'url': url, 'attempt': attempt, 'outcome': 'ok', **fields}
+        start = time.monotonic()
+        started_at = time.time()
+        try:
+            yield span
+        except Exception as e:
+            span['outcome'] = 'error'
+            span['error'] = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            self.record(span, started_at, time.monotonic() - start)
+
+    def record(self, span, started_at, duration):
+        phase = span['phase']
+        self._samples(phase).append(duration)
+        key = (phase, span['outcome'])
+        self.outcomes[key] = self.outcomes.get(key, 0) + 1
+        if self.file:
+            self.file.write(json.dumps({**span, 'start': round(started_at, 3), 'duration': round(duration, 4)},
+                                       ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def merge(self, durations, outcomes):
+        """Add another recorder's durations and outcome counts, e.g. from a worker process"""
+        for phase, values in durations.items():
+            self._samples(phase).extend(values)
+        for key, count in outcomes.items():
+            self.outcomes[key] = self.outcomes.get(key, 0) + count
+
+    def _samples(self, phase):
+        if phase not in self.durations:
+            self.durations[phase] = deque(maxlen=self.window) if self.window else []
+        return self.durations[phase]
+
+    def _phases(self):
+        known = [phase for phase in PHASES if phase in self.durations]
+        return known + sorted(phase for phase in self.durations if phase not in PHASES)
+
+    def summary(self):
+        """Per-phase count, total, p50/p95 and histogram buckets, for the stats dict"""
+        summary = {}
+        for phase in self._phases():
+            durations = sorted(self.durations[phase])
+            summary[phase] = {
+                'count': len(durations),
+                'sum': round(sum(durations), 3),
+                'p50': round(durations[int(0.50 * (len(durations) - 1))], 3),
+                'p95': round(durations[int(0.95 * (len(durations) - 1))], 3),
+                'buckets': [sum(1 for d in durations if d <= bound) for bound in HISTOGRAM_BUCKETS],
+                'outcomes': {outcome: count for (name, outcome), count in sorted(self.outcomes.items())
+                             if name == phase},
+            }
+        return summary
+
+    def write_prometheus(self, path):
+        """Write the histograms in the Prometheus text exposition format"""
+        lines = [f"# HELP {METRIC_NAME} Time spent per Airbnb scrape phase",
+                 f"# TYPE {METRIC_NAME} histogram"]
+        summary = self.summary()
+        for phase, phase_summary in summary.items():
+            for bound, count in zip(HISTOGRAM_BUCKETS, phase_summary['buckets']):
+                lines.append(f'{METRIC_NAME}_bucket{{phase="{phase}",le="{_bucket_label(bound)}"}} {count}')
+            lines.append(f'{METRIC_NAME}_sum{{phase="{phase}"}} {phase_summary["sum"]}')
+            lines.append(f'{METRIC_NAME}_count{{phase="{phase}"}} {phase_summary["count"]}')
+        lines.append("# HELP airbnb_phase_outcomes_total Finished phases by outcome")
+        lines.append("# TYPE airbnb_phase_outcomes_total counter")
+        for phase, phase_summary in summary.items():
+            for outcome, count in phase_summary['outcomes'].items():
+                lines.append(f'airbnb_phase_outcomes_total{{phase="{phase}",outcome="{outcome}"}} {count}')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write("\n".join(lines) + "\n")
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+def format_histogram(phase_summary, width=20):
+    """Text rows of one phase's histogram for print_summary"""
+    rows = []
+    previous = 0
+    peak = max(1, max(b - a for a, b in zip([0] + phase_summary['buckets'], phase_summary['buckets'])))
+    for bound, cumulative in zip(HISTOGRAM_BUCKETS, phase_summary['buckets']):
+        count = cumulative - previous
+        previous = cumulative
+        if count:
+            label = f"≤{_bucket_label(bound)}s" if bound != float('inf') else f">{HISTOGRAM_BUCKETS[-2]:g}s"
+            rows.append(f"{label:>7} {'█' * max(1, round(count / peak * width))} {count}")
+    return rows
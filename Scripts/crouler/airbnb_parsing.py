@@ -0,0 +1,301 @@
+import json
+import re
+import sys
+import time
+from collections import namedtuple
+from html.parser import HTMLParser
+
+# GraphQL operations whose responses carry the booking price for the listing
+PRICE_API_OPERATIONS = ('StaysPdpSections', 'StaysPdpBookItQuery')
+
+UNAVAILABLE_PHRASES = (
+    "those dates are not available",
+    "dates not available",
+)
+
+# Page text that means the stay cannot be booked, checked case-insensitively
+UNAVAILABLE_INDICATORS = (
+    "Those dates are not available",
+    "Dates not available",
+    "Not available",
+    "Booked",
+    "Unavailable",
+)
+
+# "฿13,952", "$1,234.50", "278 zł" with an optional "for 19 nights" after it
+PRICE_PATTERN = (
+    r'(?:(?P<prefix>[฿$€£])\s?(?P<prefix_amount>\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)'
+    r'|(?P<suffix_amount>\d{1,3}(?:[ \xa0]\d{3})+|\d+)[ \xa0]?(?P<suffix>zł))'
+    r'(?:\s*for\s+(?P<nights>\d+)\s+nights?)?'
+)
+PRICE_RE = re.compile(PRICE_PATTERN)
+
+# One pass over the page text finds both unavailability indicators and prices
+PAGE_SCAN_RE = re.compile(
+    '(?P<unavailable>(?i:' + '|'.join(re.escape(i) for i in UNAVAILABLE_INDICATORS) + '))|' + PRICE_PATTERN)
+
+# Prices below this are fees or per-guest extras, not the stay total
+MIN_BODY_PRICE = 100
+
+class Price(namedtuple('Price', 'amount currency nights text')):
+    """A parsed price; str() gives the text as shown on the page"""
+    __slots__ = ()
+
+    def __str__(self):
+        return self.text
+
+def _price_from_match(match):
+    currency = match.group('prefix') or match.group('suffix')
+    amount = match.group('prefix_amount') or match.group('suffix_amount')
+    nights = match.group('nights')
+    text = match.group(0)
+    if nights:
+        text = text[:text.rfind('for')].rstrip()
+    return Price(float(re.sub(r'[,\s]', '', amount)), currency, int(nights) if nights else None,
+                 text.replace('\xa0', ' '))
+
+def parse_price(text, nights=None):
+    """First price in `text` as a Price, or None"""
+    match = PRICE_RE.search(text or '')
+    if not match:
+        return None
+    price = _price_from_match(match)
+    if nights and not price.nights:
+        price = price._replace(nights=nights)
+    return price
+
+def scan_text(text):
+    """Single pass over page text: (first unavailability indicator or None, [Price, ...])"""
+    unavailable = None
+    prices = []
+    for match in PAGE_SCAN_RE.finditer(text or ''):
+        if match.group('unavailable'):
+            if unavailable is None:
+                unavailable = match.group('unavailable')
+        else:
+            prices.append(_price_from_match(match))
+    return unavailable, prices
+
+def analyse_snapshot(snapshot):
+    """Availability and best price from a page snapshot
+
+    A snapshot is a dict with the visible 'body' text, the texts of the
+    [data-testid*=price] nodes ('price_nodes') and of the booking
+    sidebar ('sidebar'), as returned by SNAPSHOT_JS or snapshot_from_html.
+    Returns (available, indicator, price).
+    """
+    unavailable, body_prices = scan_text(snapshot.get('body'))
+    if unavailable:
+        return False, unavailable, None
+
+    # Price nodes first, then the sidebar, then anything big enough in the body
+    _, sidebar_prices = scan_text(snapshot.get('sidebar'))
+    for text in snapshot.get('price_nodes') or []:
+        price = parse_price(text)
+        if price:
+            # The node often holds the bare amount, "for N nights" sits next to it
+            for quoted in sidebar_prices:
+                if not price.nights and quoted.nights and quoted.amount == price.amount:
+                    price = price._replace(nights=quoted.nights)
+            return True, None, price
+    if sidebar_prices:
+        return True, None, sidebar_prices[0]
+    for price in body_prices:
+        if price.amount >= MIN_BODY_PRICE:
+            return True, None, price
+    return True, None, None
+
+class _SnapshotParser(HTMLParser):
+    """Collect the same texts SNAPSHOT_JS reads, from saved HTML"""
+
+    VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+    SKIP = {'script', 'style', 'noscript', 'template'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []  # (tag, kind) where kind is 'price', 'sidebar', 'skip' or None
+        self.body = []
+        self.price_nodes = []
+        self.sidebar = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID:
+            return
+        testid = dict(attrs).get('data-testid') or ''
+        kind = None
+        if tag in self.SKIP:
+            kind = 'skip'
+        elif testid == 'bookit-sidebar':
+            kind = 'sidebar'
+        elif 'price' in testid:
+            kind = 'price'
+            self.price_nodes.append([])
+        self.stack.append((tag, kind))
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        kinds = {kind for _, kind in self.stack}
+        if 'skip' in kinds:
+            return
+        self.body.append(data)
+        if 'sidebar' in kinds:
+            self.sidebar.append(data)
+        if 'price' in kinds and self.price_nodes:
+            self.price_nodes[-1].append(data)
+
+def snapshot_from_html(html):
+    """Build a snapshot like SNAPSHOT_JS returns from saved listing HTML"""
+    parser = _SnapshotParser()
+    parser.feed(html)
+    parser.close()
+    return {
+        'body': ' '.join(parser.body),
+        'price_nodes': [''.join(node) for node in parser.price_nodes],
+        'sidebar': ' '.join(parser.sidebar),
+    }
+
+def is_price_response(url):
+    """True if the URL is one of the XHR calls that carries the booking price"""
+    if '/api/v3/' not in url:
+        return False
+    return any(operation in url for operation in PRICE_API_OPERATIONS)
+
+def parse_price_text(text):
+    """Split a display price like '฿13,952' or '278 zł' into (amount, currency)"""
+    price = parse_price(text)
+    if not price:
+        return None, None
+    return price.amount, price.currency
+
+def parse_nights(text):
+    """Pull the stay length out of text like 'for 19 nights'"""
+    if not text:
+        return None
+    match = re.search(r'(\d+)\s+nights?', text)
+    return int(match.group(1)) if match else None
+
+def _walk(node):
+    """Yield every dict inside a decoded JSON document"""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+def _strings(node):
+    """Yield every string inside a decoded JSON document"""
+    if isinstance(node, str):
+        yield node
+    elif isinstance(node, dict):
+        for value in node.values():
+            yield from _strings(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _strings(value)
+
+def parse_booking_payload(payload):
+    """Read price, currency, nights and availability from a booking API response
+
+    Returns a dict with 'price' (display string), 'amount', 'currency',
+    'nights', 'original_price' and 'available', or None when the payload
+    says nothing about the booking.
+    """
+    for node in _walk(payload):
+        display = node.get('structuredDisplayPrice')
+        if not isinstance(display, dict) or not isinstance(display.get('primaryLine'), dict):
+            continue
+        line = display['primaryLine']
+        text = line.get('discountedPrice') or line.get('price')
+        price = parse_price(text, parse_nights(line.get('qualifier') or line.get('accessibilityLabel')))
+        if not price:
+            continue
+        return {
+            'price': price,
+            'amount': price.amount,
+            'currency': price.currency,
+            'nights': price.nights,
+            'original_price': line.get('originalPrice'),
+            'available': True,
+        }
+
+    for text in _strings(payload):
+        lowered = text.lower()
+        if any(phrase in lowered for phrase in UNAVAILABLE_PHRASES):
+            return {
+                'price': None,
+                'amount': None,
+                'currency': None,
+                'nights': None,
+                'original_price': None,
+                'available': False,
+            }
+
+    return None
+
+# <script type="application/json"> blocks the listing page bootstraps its state from
+BOOTSTRAP_SCRIPT_RE = re.compile(r'<script\b[^>]*type="application/json"[^>]*>(.*?)</script>', re.S)
+
+def parse_bootstrap_html(html):
+    """Booking price and availability from the JSON state embedded in listing HTML
+
+    Returns the parse_booking_payload dict of the first script block that
+    carries the booking, or None when the page was served without it.
+    """
+    for match in BOOTSTRAP_SCRIPT_RE.finditer(html or ''):
+        try:
+            payload = json.loads(match.group(1))
+        except ValueError:
+            continue
+        booking = parse_booking_payload(payload)
+        if booking:
+            return booking
+    return None
+
+# Search card text like "324 zł for 5 nights, originally 355 zł"
+SEED_PRICE_RE = re.compile(r'^(?P<price>.+?)\s+for\s+(?P<nights>\d+)\s+nights?(?:,\s*originally\s+(?P<original>.+))?$')
+
+def parse_seed_price(row):
+    """Read the search-card price embedded in a seed CSV row
+
+    The export's column names are generated class names, so the cell is
+    found by its text. Returns a dict with 'price', 'amount', 'currency',
+    'nights' and 'original_price', or None when the row carries no price.
+    """
+    for cell in row[1:]:
+        match = SEED_PRICE_RE.match(cell.replace('\xa0', ' ').strip())
+        if not match:
+            continue
+        price = parse_price(match.group('price'), int(match.group('nights')))
+        if not price:
+            continue
+        return {
+            'price': price,
+            'amount': price.amount,
+            'currency': price.currency,
+            'nights': price.nights,
+            'original_price': match.group('original'),
+        }
+    return None
+
+if __name__ == "__main__":
+    # Parse recorded responses and saved pages offline:
+    # python airbnb_parsing.py fixtures/*.json fixtures/*.html
+    for path in sys.argv[1:]:
+        with open(path, 'r', encoding='utf-8') as file:
+            if path.endswith('.html'):
+                html = file.read()
+                snapshot = snapshot_from_html(html)
+                start = time.perf_counter()
+                result = analyse_snapshot(snapshot)
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"{path}: {result} [{len(snapshot['body'])} chars in {elapsed:.2f} ms]")
+                print(f"{path} bootstrap: {parse_bootstrap_html(html)}")
+            else:
+                print(f"{path}: {parse_booking_payload(json.load(file))}")
@@ -0,0 +1,100 @@
+from urllib.parse import urlparse
+
+# Resource types that never affect the price or availability
+BLOCKED_RESOURCE_TYPES = ('image', 'media', 'font')
+
+# URL fragments for photos, map tiles and analytics beacons
+DENY_PATTERNS = (
+    'a0.muscache.com/im/',
+    'maps.googleapis.com',
+    'maps.gstatic.com',
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'facebook.net',
+    'facebook.com/tr',
+    'bat.bing.com',
+    'sentry.io',
+    '/tracking/',
+)
+
+# Always let these through, even if a deny rule matches
+ALLOW_PATTERNS = (
+    '/api/v3/',
+)
+
+# Rough transfer size per blocked request, used to estimate bandwidth saved
+ESTIMATED_BYTES = {
+    'image': 120_000,
+    'media': 500_000,
+    'font': 40_000,
+    'script': 30_000,
+    'xhr': 2_000,
+    'fetch': 2_000,
+    'ping': 500,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+class RoutePolicy:
+    """Decide which requests to abort and count what was saved
+
+    Install on a browser context with context.route("**/*", policy.handle)
+    (or policy.handle_async for playwright.async_api). Allow patterns win
+    over deny patterns and blocked resource types.
+    """
+
+    def __init__(self, blocked_types=BLOCKED_RESOURCE_TYPES, deny=DENY_PATTERNS, allow=ALLOW_PATTERNS):
+        self.blocked_types = set(blocked_types)
+        self.deny = tuple(deny)
+        self.allow = tuple(allow)
+        self.allowed_requests = 0
+        self.blocked_requests = 0
+        self.bytes_saved = 0
+        self.blocked_by_type = {}
+
+    def should_block(self, url, resource_type):
+        if urlparse(url).scheme in ('data', 'blob'):
+            return False
+        if any(pattern in url for pattern in self.allow):
+            return False
+        if resource_type in self.blocked_types:
+            return True
+        return any(pattern in url for pattern in self.deny)
+
+    def _decide(self, request):
+        resource_type = request.resource_type
+        if self.should_block(request.url, resource_type):
+            self.blocked_requests += 1
+            self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+            self.bytes_saved += ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+            return True
+        self.allowed_requests += 1
+        return False
+
+    def handle(self, route):
+        if self._decide(route.request):
+            route.abort()
+        else:
+            route.continue_()
+
+    async def handle_async(self, route):
+        if self._decide(route.request):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def merge(self, counters):
+        """Add the counters() of another policy, e.g. one used in a worker process"""
+        self.allowed_requests += counters['allowed_requests']
+        self.blocked_requests += counters['blocked_requests']
+        self.bytes_saved += counters['bytes_saved']
+        for resource_type, count in counters['blocked_by_type'].items():
+            self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + count
+
+    def counters(self):
+        return {
+            'allowed_requests': self.allowed_requests,
+            'blocked_requests': self.blocked_requests,
+            'bytes_saved': self.bytes_saved,
+            'blocked_by_type': dict(self.blocked_by_type),
+        }
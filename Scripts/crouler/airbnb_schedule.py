@@ -0,0 +1,77 @@
+import heapq
+import statistics
+import time
+from datetime import date
+
+# Weights of the re-pricing priority terms
+AGE_WEIGHT = 1.0           # per day since the stay was last checked
+VOLATILITY_WEIGHT = 4.0    # multiplies the age term by 1 + weight * coefficient of variation
+PROXIMITY_WEIGHT = 2.0     # stays starting now score the full weight, halving every PROXIMITY_HALF_LIFE days
+PROXIMITY_HALF_LIFE = 14
+NOT_AVAILABLE_WEIGHT = 1.5  # booked stays free up on cancellations
+NEVER_CHECKED = 1000.0      # a stay with no history goes first
+
+def stay_priority(history, check_in, now=None, today=None):
+    """Re-pricing priority of one stay from its scrape history (newest first, see ResultStore.history)
+
+    Higher is more urgent. Combines the days since the last check, scaled
+    up for stays whose price has moved, how soon the stay starts, and a
+    bonus if it was last seen booked. Stays already started score None.
+    """
+    now = now or time.time()
+    today = today or date.today()
+    try:
+        days_until = (date.fromisoformat(check_in) - today).days if check_in else None
+    except ValueError:
+        days_until = None
+    if days_until is not None and days_until < 0:
+        return None
+    if not history:
+        return NEVER_CHECKED
+
+    age_days = (now - history[0]['scraped_at']) / 86400
+    amounts = [entry['amount'] for entry in history if entry['amount']]
+    volatility = statistics.pstdev(amounts) / statistics.mean(amounts) if len(amounts) > 1 else 0.0
+    score = AGE_WEIGHT * age_days * (1 + VOLATILITY_WEIGHT * volatility)
+    if days_until is not None:
+        score += PROXIMITY_WEIGHT * 0.5 ** (days_until / PROXIMITY_HALF_LIFE)
+    if history[0]['status'] == 'not_available':
+        score += NOT_AVAILABLE_WEIGHT
+    return score
+
+def schedule_listings(listings, stays_for, store, budget, stats=None):
+    """Yield the listings most likely to have changed first, stopping after `budget` page loads
+
+    `listings` yields (row_num, room_id, url, row) and `stays_for(url)` the
+    stays priced for a listing. A listing's priority is that of its most
+    urgent stay, and it costs one page load however many stays it sweeps.
+    Listings the loop answers without the browser (seed export, result
+    store, HTTP tier) count in stats['browserless'] and are not charged;
+    sharded runs deal the whole schedule out first, so there every listing
+    is. Listings left over are counted in stats['deferred'] and those with
+    every stay already started in stats['past_stays'].
+    """
+    heap = []
+    skipped = 0
+    for row_num, room_id, original_url, row in listings:
+        scores = [stay_priority(store.history(room_id, check_in, check_out), check_in)
+                  for check_in, check_out in stays_for(original_url)]
+        scores = [score for score in scores if score is not None]
+        if not scores:
+            skipped += 1
+            continue
+        heapq.heappush(heap, (-max(scores), row_num, (row_num, room_id, original_url, row)))
+
+    print(f"🗓️  Scheduler: {len(heap)} listings queued, page-load budget {budget}"
+          + (f", {skipped} with stays already started" if skipped else ""))
+    handed_out = 0
+    while heap and handed_out - (stats or {}).get('browserless', 0) < budget:
+        score, _, item = heapq.heappop(heap)
+        handed_out += 1
+        print(f"🗓️  Priority {-score:.2f}: row {item[0]}, room {item[1]}")
+        yield item
+    if stats is not None:
+        stats['deferred'] = len(heap)
+        stats['past_stays'] = skipped
+    if heap:
+        print(f"🗓️  Budget spent, {len(heap)} listings deferred to the next run")
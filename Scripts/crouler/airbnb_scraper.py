@@ -1,9 +1,64 @@
+import argparse
+import contextlib
 import csv
+import json
+import os
 import re
+import sys
 import time
+from datetime import date, timedelta
 from playwright.sync_api import Playwright, sync_playwright, expect
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from urllib.parse import urlparse, parse_qs
 
+from airbnb_parsing import Price, analyse_snapshot, is_price_response, parse_booking_payload, parse_price, parse_seed_price
+from airbnb_store import DEFAULT_CACHE_TTL, DEFAULT_DB, ResultStore, price_status
+from airbnb_routing import ALLOW_PATTERNS, BLOCKED_RESOURCE_TYPES, DENY_PATTERNS, RoutePolicy
+from airbnb_metrics import PhaseSpans, format_histogram
+from airbnb_http import HttpFetcher
+from airbnb_schedule import schedule_listings
+from airbnb_errors import (FAIL_FAST, PHASE_RETRIES, POLICIES, RETRY_PHASE, CircuitBreaker, NavigationTimeout,
+                           PriceNotFound, SelectorMissing, check_blocked, check_navigation, classify)
+from airbnb_supervisor import (BROWSER_MAX_LISTINGS, BROWSER_RSS_CAP_MB, PYTHON_RSS_CAP_MB, SPAN_WINDOW,
+                               MemoryCapExceeded, build_supervisor, supervise)
+
+BASE_URL = 'https://www.airbnb.com'  # default listing host, --base-url points a run at a stand-in server
+HEADLESS = True          # run Chromium without a display
+MAX_CONTEXT_USES = 20    # recycle a browser context after this many listings
+DEFAULT_RPM = 8          # page loads per minute per host (old fixed sleeps averaged ~7s)
+DEFAULT_CONCURRENCY = 4  # listings in flight at once in --async mode
+
+# Latency budget per scrape phase, in milliseconds
+PHASE_BUDGETS = {
+    'goto': 30000,        # navigation until DOMContentLoaded
+    'response': 10000,    # booking API response before falling back to the DOM
+    'settle': 5000,       # networkidle after navigation
+    'popup': 2000,        # popup appearing
+    'popup_retry': 500,   # popup reappearing before an in-page retry
+    'dates': 5000,        # "Change dates" button and sidebar reflecting the stay
+    'calendar': 5000,     # calendar rendering the requested days
+    'price': 10000,       # price node showing up
+    'backoff': 2000,      # pause per retry when no rate limiter spaces page loads
+}
+
+POPUP_CHECK_ONCE = 0      # popup timeout meaning "look once, don't wait" (see dismiss_popup)
+CALENDAR_MAX_MONTHS = 12  # how far forward the calendar is paged to find a day
+
+# Columns of the streamed result files
+RESULT_FIELDS = ['row', 'room_id', 'check_in', 'check_out', 'price', 'amount', 'currency', 'nights',
+                 'original_price', 'status', 'source', 'elapsed', 'url']
+
+# Visible texts that availability and price checks read, in a single evaluate call
+SNAPSHOT_JS = """() => ({
+    body: document.body ? document.body.innerText : '',
+    price_nodes: [...document.querySelectorAll("[data-testid*='price']")].map(node => node.innerText),
+    sidebar: (document.querySelector("[data-testid='bookit-sidebar']") || {}).innerText || '',
+})"""
+
+# True once a price node with a currency symbol is in the DOM
+PRICE_READY_JS = """() => [...document.querySelectorAll("[data-testid*='price'], [data-testid='bookit-sidebar']")]
+    .some(node => /[฿$]|zł/.test(node.textContent))"""
+
 def extract_room_id(url):
     """Extract room ID from Airbnb URL"""
     # Match pattern after /rooms/ and before ?
@@ -26,9 +81,9 @@ def clean_url(url):
     base_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
     return base_url
 
-def reconstruct_url(room_id, check_in=None, check_out=None):
-    """Reconstruct Airbnb URL with room ID and optional dates"""
-    base_url = f"https://www.airbnb.com/rooms/{room_id}"
+def reconstruct_url(room_id, check_in=None, check_out=None, base_url=BASE_URL):
+    """Reconstruct Airbnb URL with room ID and optional dates, on `base_url`"""
+    room_url = f"{base_url}/rooms/{room_id}"
     params = []
 
     if check_in:
@@ -41,9 +96,16 @@ def reconstruct_url(room_id, check_in=None, check_out=None):
 
     if params:
         query_string = "&".join(params)
-        return f"{base_url}?{query_string}"
+        return f"{room_url}?{query_string}"
 
-    return base_url
+    return room_url
+
+def stay_nights(check_in, check_out):
+    """Number of nights between two YYYY-MM-DD dates, or None"""
+    try:
+        return (date.fromisoformat(check_out) - date.fromisoformat(check_in)).days
+    except (TypeError, ValueError):
+        return None
 
 def format_date_for_selection(date_str):
     """Convert YYYY-MM-DD to format for calendar selection"""
@@ -54,354 +116,1270 @@ def format_date_for_selection(date_str):
         year, month, day = date_str.split('-')
         months = ['January', 'February', 'March', 'April', 'May', 'June',
                   'July', 'August', 'September', 'October', 'November', 'December']
+        weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
         month_name = months[int(month) - 1]
         day_num = int(day.lstrip('0'))
+        weekday = weekdays[date(int(year), int(month), day_num).weekday()]
 
-        return f"{day_num}, {month_name}, {year}."
+        # Calendar day buttons are labelled like "23, Sunday, November 2025."
+        return f"{day_num}, {weekday}, {month_name} {year}."
     except:
         return None
 
-def scrape_airbnb_price(url, check_in_date, check_out_date, max_retries=3):
-    """Scrape price from a single Airbnb URL with retry logic"""
-    for attempt in range(max_retries):
-        with sync_playwright() as playwright:
-            browser = playwright.chromium.launch(headless=False)
-            context = browser.new_context()
-            page = context.new_page()
+def parse_sweep_ranges(text):
+    """Parse "2025-11-23:2025-11-28,2025-12-01:2025-12-05" into [(check_in, check_out), ...]"""
+    stays = []
+    for item in text.split(','):
+        check_in, _, check_out = item.strip().partition(':')
+        if not stay_nights(check_in, check_out) or stay_nights(check_in, check_out) < 1:
+            raise ValueError(f"invalid stay {item!r}, expected CHECK_IN:CHECK_OUT")
+        stays.append((check_in, check_out))
+    return stays
+
+def sweep_date_ranges(start, nights, step, count):
+    """Stays of `nights` nights starting at `start` and every `step` days after, `count` in total"""
+    first = date.fromisoformat(start)
+    stays = []
+    for i in range(count):
+        check_in = first + timedelta(days=i * step)
+        stays.append((check_in.isoformat(), (check_in + timedelta(days=nights)).isoformat()))
+    return stays
+
+class RateLimiter:
+    """Token bucket per host, refilled at `rpm` requests per minute"""
+
+    def __init__(self, rpm=DEFAULT_RPM, burst=1):
+        self.rate = rpm / 60.0
+        self.burst = burst
+        self.buckets = {}  # host -> (tokens, last refill)
+
+    def reserve(self, url):
+        """Take a token for the URL's host and return seconds to wait for it"""
+        host = urlparse(url).netloc
+        now = time.monotonic()
+        tokens, last = self.buckets.get(host, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+        self.buckets[host] = (tokens, now)
+        return max(0.0, -tokens / self.rate)
+
+    def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            print(f"⏳ Rate limit: waiting {delay:.1f}s before next page load...")
+            time.sleep(delay)
+
+def load_storage_state(path):
+    """Saved cookies and localStorage from a storage-state file, or None"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Ignoring unreadable session state {path}: {e}")
+        return None
 
-            try:
-                print(f"🚀 Attempt {attempt + 1}/{max_retries}: Opening URL: {url}")
-
-                # Monitor network activity
-                print("📡 Monitoring network requests...")
-                request_count = 0
-
-                def handle_request(request):
-                    nonlocal request_count
-                    request_count += 1
-                    if request_count <= 5:  # Show first few requests
-                        print(f"   📤 Request {request_count}: {request.url}")
-
-                def handle_response(response):
-                    if request_count <= 5:  # Show first few responses
-                        print(f"   📥 Response: {response.status} - {response.url}")
-
-                page.on("request", handle_request)
-                page.on("response", handle_response)
-
-                # Navigate with longer timeout
-                print(f"⏳ Loading page (timeout: 30s)...")
-                start_time = time.time()
-                page.goto(url, timeout=30000, wait_until='domcontentloaded')
-
-                # Wait for network to be calm with progressive timeout
-                print("🌐 Waiting for network activity to settle...")
-                for i in range(10):  # Check network status every 2 seconds for 20 seconds total
-                    try:
-                        page.wait_for_load_state('networkidle', timeout=2000)
-                        elapsed = time.time() - start_time
-                        print(f"✅ Network settled after {elapsed:.1f}s")
-                        break
-                    except:
-                        elapsed = time.time() - start_time
-                        print(f"   ⏱️  Still loading... {elapsed:.1f}s elapsed")
-                        if i == 9:  # Last attempt
-                            print("⚠️  Network didn't fully settle, proceeding anyway...")
-                            break
-
-                # Close any popups
+def write_storage_state(path, state):
+    """Write a storage state atomically, so concurrent workers never leave half a file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+    os.replace(tmp_path, path)
+
+class PoolState:
+    """Bookkeeping shared by BrowserPool and AsyncBrowserPool
+
+    Which contexts are idle, how often each was used, whether the session
+    still needs saving and whether the popup is still expected. Nothing
+    here talks to Playwright beyond asking if the browser is connected,
+    so both pools make the same decisions and only do the I/O their way.
+    """
+
+    def __init__(self, playwright, headless=HEADLESS, max_context_uses=MAX_CONTEXT_USES, route_policy=None,
+                 storage_state=None, profile_dir=None):
+        self.playwright = playwright
+        self.headless = headless
+        self.max_context_uses = max_context_uses
+        self.route_policy = route_policy
+        self.storage_state = storage_state
+        self.profile_dir = profile_dir
+        self.browser = None
+        self.persistent = None
+        self.idle_contexts = []
+        self.context_uses = {}
+        self.session_saved = False
+        self.warm_session = bool(profile_dir and os.path.isdir(profile_dir) and os.listdir(profile_dir))
+        self.popup_gone = False  # a warm session showed no popup last time
+
+    def browser_alive(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    def _browser_launched(self, browser):
+        """Contexts of an earlier browser died with it"""
+        self.browser = browser
+        self.idle_contexts = []
+        self.context_uses = {}
+
+    def _checkout(self, context, state=None):
+        """Count a use of `context`; a new one (not idle before) may have started from `state`"""
+        if context not in self.context_uses:
+            self.warm_session = self.warm_session or bool(state)
+            self.context_uses[context] = 0
+        self.context_uses[context] += 1
+        return context
+
+    def _profile_crashed(self, context):
+        print("♻️  Profile context crashed, will relaunch on next listing")
+        if self.persistent is context:
+            self.persistent = None
+
+    def _checkin(self, context, crashed):
+        """Decide what release does with a context: (save the session first, keep it for reuse)
+
+        A crashed context, one past max_context_uses or one whose browser
+        died is closed instead of kept; a dead browser is dropped so the
+        next acquire launches a new one.
+        """
+        uses = self.context_uses.pop(context, self.max_context_uses)
+        browser_alive = self.browser_alive()
+        save = not crashed and browser_alive and (not self.session_saved or uses >= self.max_context_uses)
+        keep = not crashed and browser_alive and uses < self.max_context_uses
+        if keep:
+            self.context_uses[context] = uses
+        elif crashed and not browser_alive and self.browser is not None:
+            print("♻️  Browser crashed, will relaunch on next listing")
+            self.browser = None
+        return save, keep
+
+    def _drain(self):
+        """Every context close() has to close, with the pool emptied"""
+        contexts = self.idle_contexts + ([self.persistent] if self.persistent else [])
+        self.idle_contexts = []
+        self.context_uses = {}
+        self.persistent = None
+        return contexts
+
+    def popup_budget(self, budgets):
+        """Popup wait for the next page: a single check once a warm session stopped showing it"""
+        return POPUP_CHECK_ONCE if self.popup_gone else budgets['popup']
+
+    def note_popup(self, found):
+        """Record whether the popup showed up on a page from this pool"""
+        self.popup_gone = self.warm_session and not found
+
+class BrowserPool(PoolState):
+    """Keep one Chromium running and hand out reusable contexts per listing
+
+    With `storage_state`, new contexts start from the cookies and
+    localStorage saved there (consent choice, dismissed popups) and the
+    session is written back as listings succeed. With `profile_dir`,
+    Chromium runs on that persistent profile instead: one context shared
+    by every listing, with its HTTP cache on disk.
+    """
+
+    def _ensure_browser(self):
+        if not self.browser_alive():
+            print(f"🌍 Launching Chromium (headless={self.headless})...")
+            self._browser_launched(self.playwright.chromium.launch(headless=self.headless))
+        return self.browser
+
+    def _ensure_persistent(self):
+        if self.persistent is None:
+            print(f"🌍 Launching Chromium on profile {self.profile_dir} (headless={self.headless})...")
+            self.persistent = self.playwright.chromium.launch_persistent_context(self.profile_dir,
+                                                                               headless=self.headless)
+            if self.route_policy:
+                self.persistent.route("**/*", self.route_policy.handle)
+            state = load_storage_state(self.storage_state)
+            if state and state.get('cookies'):
+                self.persistent.add_cookies(state['cookies'])
+                self.warm_session = True
+        return self.persistent
+
+    def acquire(self):
+        """Return a warm context, creating one if none is idle"""
+        if self.profile_dir:
+            return self._ensure_persistent()
+        browser = self._ensure_browser()
+        if self.idle_contexts:
+            return self._checkout(self.idle_contexts.pop())
+        state = load_storage_state(self.storage_state)
+        context = browser.new_context(storage_state=state) if state else browser.new_context()
+        if self.route_policy:
+            context.route("**/*", self.route_policy.handle)
+        return self._checkout(context, state)
+
+    def save_session(self, context):
+        """Write the context's cookies and localStorage to the storage-state file"""
+        if not self.storage_state:
+            return
+        try:
+            write_storage_state(self.storage_state, context.storage_state())
+            self.session_saved = True
+        except Exception as e:
+            print(f"⚠️  Could not save session state: {e}")
+
+    def release(self, context, crashed=False):
+        """Give a context back; recycle it after a crash or N uses"""
+        if self.profile_dir:
+            if crashed:
+                # Pages of other listings live in the same context, only drop it if it is dead
                 try:
-                    close_button = page.get_by_role("button", name="Close").first
-                    if close_button.is_visible(timeout=5000):
-                        close_button.click()
-                        print("✅ Closed popup")
+                    context.cookies()
                 except:
-                    print("ℹ️  No popup found")
-
-                # If dates are provided, try to set them
-                if check_in_date and check_out_date:
-                    try:
-                        print(f"📅 Setting dates: {check_in_date} to {check_out_date}")
-                        # Click on date change button
-                        date_button = page.get_by_role("button", name="Change dates")
-                        if date_button.is_visible(timeout=10000):
-                            date_button.click()
-                            print("⏳ Waiting for calendar to load...")
-                            time.sleep(3)
-
-                            # Format dates for selection
-                            check_in_formatted = format_date_for_selection(check_in_date)
-                            check_out_formatted = format_date_for_selection(check_out_date)
-
-                            if check_in_formatted and check_out_formatted:
-                                # Select check-in date
-                                try:
-                                    page.get_by_test_id("bookit-sidebar-availability-calendar").get_by_role("button", name=check_in_formatted).click()
-                                    print(f"✅ Selected check-in: {check_in_formatted}")
-                                except:
-                                    print(f"⚠️  Could not find check-in date: {check_in_formatted}")
-
-                                # Select check-out date
-                                try:
-                                    page.get_by_test_id("bookit-sidebar-availability-calendar").get_by_role("button", name=check_out_formatted).click()
-                                    print(f"✅ Selected check-out: {check_out_formatted}")
-                                except:
-                                    print(f"⚠️  Could not find check-out date: {check_out_formatted}")
-
-                            time.sleep(3)
-                    except Exception as e:
-                        print(f"⚠️  Error setting dates: {e}")
-
-                # Check if room is available first
-                print("🔍 Checking room availability...")
-                is_available = check_availability(page)
-
-                if not is_available:
-                    print("🚫 Room not available - returning 'Not Available'")
-                    return "Not Available"
-
-                # Multiple attempts to extract price with progressive waiting
-                price = None
-                for price_attempt in range(3):
-                    wait_time = (price_attempt + 1) * 3  # 3s, 6s, 9s
-                    print(f"💰 Price attempt {price_attempt + 1}: waiting {wait_time}s...")
-                    time.sleep(wait_time)
-                    price = try_extract_price(page)
-
-                    if price:
-                        print(f"✅ Price found on attempt {price_attempt + 1}: {price}")
-                        break
-                    else:
-                        print(f"❌ No price found on attempt {price_attempt + 1}")
-
-                        # Try to close popups between attempts
-                        if price_attempt < 2:
-                            try:
-                                close_button = page.get_by_role("button", name="Close").first
-                                if close_button.is_visible(timeout=2000):
-                                    close_button.click()
-                                    print("✅ Closed popup during price extraction")
-                                    time.sleep(2)
-                            except:
-                                pass
-
-                print(f"{'✅' if price else '❌'} Final result: {price if price else 'Price not found'}")
-
-                if price:
-                    return price
-                else:
-                    raise Exception("Price not found after multiple attempts")
-
-            except Exception as e:
-                print(f"❌ Attempt {attempt + 1} failed: {e}")
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 5  # 5s, 10s, 15s between retries
-                    print(f"⏳ Waiting {wait_time}s before retry...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"❌ All {max_retries} attempts failed for {url}")
-                    return None
-            finally:
-                page.close()
-                context.close()
-                browser.close()
+                    self._profile_crashed(context)
+            elif not self.session_saved:
+                self.save_session(context)
+            return
+        save, keep = self._checkin(context, crashed)
+        if save:
+            self.save_session(context)
+        if keep:
+            self.idle_contexts.append(context)
+            return
+        try:
+            context.close()
+        except:
+            pass
 
-    return None
+    def close(self):
+        contexts = self._drain()
+        if contexts:
+            self.save_session(contexts[0])
+        for context in contexts:
+            try:
+                context.close()
+            except:
+                pass
+        if self.browser:
+            try:
+                self.browser.close()
+            except:
+                pass
+            self.browser = None
+
+class PriceResponseWatcher:
+    """Capture the booking API responses a page receives"""
+
+    def __init__(self, page):
+        self.page = page
+        self.responses = []
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if is_price_response(response.url):
+            self.responses.append(response)
+
+    def mark(self):
+        """Position to pass as `since` to ignore responses received so far"""
+        return len(self.responses)
+
+    def latest_booking(self, since=0):
+        # Newest first: a date change supersedes the initial page load
+        for response in reversed(self.responses[since:]):
+            try:
+                booking = parse_booking_payload(response.json())
+            except:
+                continue
+            if booking:
+                return booking
+        return None
 
-def check_availability(page):
-    """Check if the room is available for the selected dates"""
+    def wait_for_booking(self, timeout=PHASE_BUDGETS['response'], since=0):
+        """Return the parsed booking as soon as a price response arrives, or None"""
+        deadline = time.monotonic() + timeout / 1000
+        booking = self.latest_booking(since)
+        while not booking and time.monotonic() < deadline:
+            try:
+                self.page.wait_for_event(
+                    "response",
+                    predicate=lambda response: is_price_response(response.url),
+                    timeout=(deadline - time.monotonic()) * 1000)
+            except:
+                return self.latest_booking(since)
+            booking = self.latest_booking(since)
+        return booking
+
+def dismiss_popup(page, timeout):
+    """Close the welcome/translation popup if it shows up within `timeout` ms
+
+    timeout=0 checks once without waiting; Playwright itself would read 0
+    as no timeout at all.
+    """
     try:
-        # Check for "Those dates are not available" message
-        not_available_text = page.get_by_text("Those dates are not available")
-        if not_available_text.is_visible(timeout=3000):
-            print("🚫 Room is NOT available for selected dates")
-            return False
-
-        # Check for other unavailability indicators
-        unavailable_indicators = [
-            "Dates not available",
-            "Not available",
-            "Booked",
-            "Unavailable"
-        ]
-
-        page_text = page.text_content("body")
-        for indicator in unavailable_indicators:
-            if indicator.lower() in page_text.lower():
-                print(f"🚫 Room appears unavailable (found: {indicator})")
+        close_button = page.get_by_role("button", name="Close").first
+        if timeout <= 0:
+            if not close_button.is_visible():
                 return False
-
-        print("✅ Room appears to be available")
+        else:
+            close_button.wait_for(state="visible", timeout=timeout)
+        close_button.click()
+        print("✅ Closed popup")
         return True
-
-    except Exception as e:
-        print(f"⚠️  Could not check availability: {e}")
-        return True  # Assume available if we can't check
-
-def try_extract_price(page):
-    """Try to extract price using multiple methods"""
-    price = None
-
-    # Method 1: Look for price breakdown text
-    try:
-        price_elements = page.locator("[data-testid*='price']").all()
-        for element in price_elements:
-            text = element.text_content()
-            if text and ('฿' in text or 'zł' in text or '$' in text):
-                price = text
-                print(f"💰 Method 1 found price: {price}")
-                return price
     except:
-        pass
-
-    # Method 2: Look for price in booking sidebar (from old script)
-    if not price:
+        return False
+
+def show_calendar_day(calendar, formatted, max_months=CALENDAR_MAX_MONTHS):
+    """Page the calendar forward until the day button is on screen and return it"""
+    day = calendar.get_by_role("button", name=formatted)
+    for _ in range(max_months):
+        if day.is_visible():
+            return day
+        calendar.get_by_role("button", name="Move forward").click()
+    return day
+
+def select_dates(page, check_in_date, check_out_date, budgets):
+    """Pick the stay in the sidebar calendar and wait until the sidebar shows it"""
+    print(f"📅 Setting dates: {check_in_date} to {check_out_date}")
+    check_in_formatted = format_date_for_selection(check_in_date)
+    check_out_formatted = format_date_for_selection(check_out_date)
+    if not (check_in_formatted and check_out_formatted):
+        return False
+
+    # Click on date change button
+    date_button = page.get_by_role("button", name="Change dates")
+    date_button.first.wait_for(state="visible", timeout=budgets['dates'])
+    date_button.first.click()
+
+    # Calendar is ready once its month navigation is rendered
+    print("⏳ Waiting for calendar to render...")
+    calendar = page.get_by_test_id("bookit-sidebar-availability-calendar")
+    calendar.get_by_role("button", name="Move forward").wait_for(state="visible", timeout=budgets['calendar'])
+
+    for formatted in (check_in_formatted, check_out_formatted):
         try:
-            price_text = page.get_by_test_id("bookit-sidebar").text_content()
-            # Extract price using regex
-            price_match = re.search(r'[฿$zł]\s*[\d,]+', price_text)
-            if price_match:
-                price = price_match.group()
-                print(f"💰 Method 2 found price: {price}")
-                return price
+            day = show_calendar_day(calendar, formatted)
+            day.click(timeout=budgets['calendar'])
+            print(f"✅ Selected date: {formatted}")
         except:
-            pass
+            print(f"⚠️  Could not find date: {formatted}")
+            return False
 
-    # Method 3: Look for specific price text from old script
-    if not price:
+    # The "Change dates" button label carries the dates the sidebar is quoting
+    page.get_by_role("button", name=re.compile(rf"Check-in: {check_in_date}.*{check_out_date}")).first.wait_for(
+        state="visible", timeout=budgets['dates'])
+    print("✅ Sidebar reflects selected dates")
+    return True
+
+def wait_for_price(page, watcher, budgets, since=0, snapshot=None):
+    """Poll for a price until a price node or booking response turns up"""
+    deadline = time.monotonic() + budgets['price'] / 1000
+    price_attempt = 0
+    price_node_seen = False
+    while True:
+        price_attempt += 1
+        booking = watcher.latest_booking(since) if watcher else None
+        price = booking['price'] if booking and booking['available'] else try_extract_price(page, snapshot)
+        snapshot = None  # only the first poll may reuse the caller's snapshot
+        if price:
+            print(f"✅ Price found on attempt {price_attempt}: {price}")
+            return price
+
+        remaining = (deadline - time.monotonic()) * 1000
+        if remaining <= 0:
+            return None
+        if price_node_seen:
+            # A price node is there but nothing parses out of it, waiting won't help
+            return None
+        print(f"❌ No price yet, waiting up to {remaining / 1000:.1f}s for a price node...")
+        dismiss_popup(page, timeout=0)
         try:
-            # Try the exact selector from the old script
-            price_element = page.get_by_text("฿").first
-            if price_element.is_visible(timeout=2000):
-                text = price_element.text_content()
-                if text and ('฿' in text or 'zł' in text or '$' in text):
-                    price = text
-                    print(f"💰 Method 3 found price: {price}")
-                    return price
+            page.wait_for_function(PRICE_READY_JS, timeout=remaining)
+            price_node_seen = True
         except:
             pass
 
-    # Method 4: General text search for price patterns
-    if not price:
+def attach_debug_logging(page, limit=5):
+    """Print the first `limit` requests and responses, then detach the handlers"""
+    counts = {'request': 0, 'response': 0}
+
+    def handle_request(request):
+        counts['request'] += 1
+        print(f"   📤 Request {counts['request']}: {request.url}")
+        if counts['request'] >= limit:
+            page.remove_listener("request", handle_request)
+
+    def handle_response(response):
+        counts['response'] += 1
+        print(f"   📥 Response: {response.status} - {response.url}")
+        if counts['response'] >= limit:
+            page.remove_listener("response", handle_response)
+
+    page.on("request", handle_request)
+    page.on("response", handle_response)
+
+def load_listing(page, url, budgets):
+    """Navigate to a listing, raising a classified error when it does not load"""
+    try:
+        response = page.goto(url, timeout=budgets['goto'], wait_until='domcontentloaded')
+    except PlaywrightTimeoutError as e:
+        raise NavigationTimeout(str(e)) from e
+    check_navigation(response.status if response else None, page.url, extract_room_id(url))
+
+def retry_in_phase(error, doing):
+    """Re-raise `error` unless its kind is retried on the live page (RETRY_PHASE)"""
+    kind = classify(error)
+    if POLICIES[kind] != RETRY_PHASE:
+        raise error
+    print(f"⚠️  Error {doing} ({kind}): {error}")
+
+def select_dates_with_retry(page, check_in_date, check_out_date, budgets):
+    """select_dates, retried on the live page PHASE_RETRIES times; False if it never worked"""
+    for phase_try in range(PHASE_RETRIES + 1):
+        try:
+            if select_dates(page, check_in_date, check_out_date, budgets):
+                return True
+            error = SelectorMissing("calendar day not found")
+        except Exception as e:
+            error = e
+        retry_in_phase(error, "setting dates")
+        if phase_try < PHASE_RETRIES:
+            page.keyboard.press("Escape")
+            dismiss_popup(page, budgets['popup_retry'])
+    return False
+
+def booking_price(booking):
+    """The price or "Not Available" a parsed booking response quotes, None without one"""
+    if not booking:
+        return None
+    return booking['price'] if booking['available'] else "Not Available"
+
+def attempt_failed(error, label, subject, breaker=None):
+    """Classify a failed page attempt and tell the breaker; False if it must not be retried"""
+    kind = classify(error)
+    if breaker:
+        breaker.record(kind)
+    print(f"❌ {label} failed for {subject} ({kind}): {error}")
+    if POLICIES[kind] == FAIL_FAST:
+        print(f"⛔ Not retrying {subject}: {kind}")
+        return False
+    return True
+
+def retry_delay(attempt, max_retries, budgets, limiter=None):
+    """Seconds to back off before the next attempt, None once `max_retries` are used up
+
+    With a limiter the next page load is already spaced out, so there is no backoff.
+    """
+    if attempt >= max_retries:
+        return None
+    return 0 if limiter else budgets['backoff'] * attempt / 1000
+
+def scrape_attempt(page, pool, url, check_in_date, check_out_date, attempt, watcher, budgets, spans):
+    """One page load of scrape_airbnb_price: a price, "Not Available", or a ScrapeError"""
+    print(f"⏳ Loading page (budget: {budgets['goto'] / 1000:.0f}s)...")
+    with spans.span('goto', url, attempt):
+        load_listing(page, url, budgets)
+
+    # The URL already carries the dates, so the first booking response is enough
+    if watcher:
+        print("📡 Waiting for booking API response...")
+        with spans.span('response', url, attempt) as span:
+            booking = watcher.wait_for_booking(budgets['response'])
+            price = booking_price(booking)
+            span['outcome'] = price_status(price) if booking else 'absent'
+        if price == "Not Available":
+            print("🚫 Booking API says dates are not available")
+            return price
+        if price:
+            print(f"✅ Price from booking API: {price} ({booking['nights']} nights, {booking['currency']})")
+            return price
+        print("⚠️  No booking API response, falling back to page scraping")
+
+    # Wait for network to be calm, but never longer than the budget
+    print("🌐 Waiting for network activity to settle...")
+    with spans.span('settle', url, attempt) as span:
         try:
-            page_text = page.text_content("body")
-            # Look for patterns like "฿13,952 for 19 nights" or "278 zł"
-            price_patterns = [
-                r'[฿$zł]\s*\d{1,3}(?:,\d{3})*(?:\.\d{2})?',
-                r'[฿$zł]\s*\d+(?:\.\d{2})?'
-            ]
-
-            for pattern in price_patterns:
-                matches = re.findall(pattern, page_text)
-                if matches:
-                    # Take the first match that looks like a main price
-                    for match in matches:
-                        if len(match.replace(',', '').replace('฿', '').replace('$', '').replace('zł', '').replace(' ', '')) > 2:
-                            price = match
-                            print(f"💰 Method 4 found price: {price}")
-                            return price
+            page.wait_for_load_state('networkidle', timeout=budgets['settle'])
+            print("✅ Network settled")
         except:
-            pass
+            span['outcome'] = 'timeout'
+            print(f"⚠️  Network didn't settle within {budgets['settle'] / 1000:.1f}s, proceeding anyway...")
+
+    # Close any popups; a saved session that stopped showing one is only checked, not waited on
+    with spans.span('popup', url, attempt) as span:
+        found = dismiss_popup(page, pool.popup_budget(budgets))
+        pool.note_popup(found)
+        if not found:
+            span['outcome'] = 'absent'
+            print("ℹ️  No popup found")
+
+    # If dates are provided, try to set them; the URL carries them anyway
+    if check_in_date and check_out_date:
+        with spans.span('dates', url, attempt) as span:
+            if not select_dates_with_retry(page, check_in_date, check_out_date, budgets):
+                span['outcome'] = 'failed'
+
+    # Check if room is available first
+    print("🔍 Checking room availability...")
+    with spans.span('availability', url, attempt) as span:
+        snapshot = take_snapshot(page)
+        check_blocked(snapshot.get('body'))
+        is_available = check_availability(page, snapshot)
+        if not is_available:
+            span['outcome'] = 'not_available'
+
+    if not is_available:
+        print("🚫 Room not available - returning 'Not Available'")
+        return "Not Available"
+
+    with spans.span('price', url, attempt) as span:
+        for phase_try in range(PHASE_RETRIES + 1):
+            price = wait_for_price(page, watcher, budgets, snapshot=snapshot)
+            if price:
+                break
+            snapshot = None
+            if phase_try < PHASE_RETRIES:
+                print("🔁 Price not found, retrying the price lookup on the same page...")
+                dismiss_popup(page, budgets['popup_retry'])
+        if not price:
+            span['outcome'] = 'absent'
+
+    print(f"{'✅' if price else '❌'} Final result: {price if price else 'Price not found'}")
+    if not price:
+        raise PriceNotFound("Price not found within budget")
+    return price
+
+def scrape_airbnb_price(url, check_in_date, check_out_date, max_retries=3, pool=None, limiter=None,
+                        extract_mode='network', budgets=None, spans=None, breaker=None):
+    """Scrape price from a single Airbnb URL with retry logic
+
+    Pass a BrowserPool to reuse a warm browser across listings; without one
+    a private browser is started for this call only. A RateLimiter, if given,
+    is consulted before every page load. With extract_mode='network' the
+    price is read from the booking API response and the DOM is only
+    scraped when that response never shows up. Every wait is bounded by
+    the per-phase latency budgets in PHASE_BUDGETS (milliseconds), and
+    every phase is timed into `spans` (a PhaseSpans) when one is given.
+
+    Failures are classified (see airbnb_errors.POLICIES): date selection
+    and price lookup are retried on the live page, navigation problems get
+    a fresh context, and blocked or vanished listings fail at once. A
+    CircuitBreaker, if given, sees every attempt and can pause page loads.
+    """
+    budgets = {**PHASE_BUDGETS, **(budgets or {})}
+    spans = spans or PhaseSpans()
+    if pool is None:
+        with sync_playwright() as playwright:
+            pool = BrowserPool(playwright)
+            try:
+                return scrape_airbnb_price(url, check_in_date, check_out_date, max_retries, pool, limiter,
+                                           extract_mode, budgets, spans, breaker)
+            finally:
+                pool.close()
+
+    for attempt in range(1, max_retries + 1):
+        if breaker:
+            breaker.wait()
+        context = page = None
+        crashed = False
+
+        try:
+            # A dead context fails here; like any crash it is recycled and the attempt retried
+            with spans.span('launch', url, attempt):
+                context = pool.acquire()
+                page = context.new_page()
+            print(f"🚀 Attempt {attempt}/{max_retries}: Opening URL: {url}")
+
+            # Show the first few network events, then stop listening
+            print("📡 Monitoring network requests...")
+            attach_debug_logging(page)
+            watcher = PriceResponseWatcher(page) if extract_mode == 'network' else None
+
+            if limiter:
+                limiter.wait(url)
+
+            price = scrape_attempt(page, pool, url, check_in_date, check_out_date, attempt, watcher, budgets, spans)
+            if breaker:
+                breaker.record()
+            return price
+
+        except Exception as e:
+            crashed = True
+            if not attempt_failed(e, f"Attempt {attempt}", url, breaker):
+                return None
+            wait_time = retry_delay(attempt, max_retries, budgets, limiter)
+            if wait_time is None:
+                print(f"❌ All {max_retries} attempts failed for {url}")
+                return None
+            if wait_time:
+                print(f"⏳ Waiting {wait_time:.1f}s before retry...")
+                time.sleep(wait_time)
+        finally:
+            with spans.span('teardown', url, attempt):
+                try:
+                    if page:
+                        page.close()
+                except:
+                    pass
+                if context:
+                    pool.release(context, crashed)
 
     return None
 
-def main():
-    """Main function to read CSV and process URLs"""
-    csv_file = 'airbnb.csv'
-    check_in = '2025-11-23'  # Hardcoded check-in date
-    check_out = '2026-01-06' # Hardcoded check-out date
+def read_stay_price(page, watcher, since, budgets):
+    """Price or "Not Available" for the stay the page currently shows, or None"""
+    if watcher:
+        price = booking_price(watcher.wait_for_booking(budgets['response'], since))
+        if price:
+            return price
+    snapshot = take_snapshot(page)
+    check_blocked(snapshot.get('body'))
+    if not check_availability(page, snapshot):
+        return "Not Available"
+    return wait_for_price(page, watcher, budgets, since, snapshot)
+
+def sweep_airbnb_prices(room_id, stays, pool, max_retries=3, limiter=None, extract_mode='network', budgets=None,
+                        spans=None, breaker=None, base_url=BASE_URL):
+    """Price one listing for several stays in a single page session
+
+    The page is loaded once for the first stay, then every other stay is
+    picked in the sidebar calendar of the same page. Returns
+    {(check_in, check_out): price}; stays still unpriced after
+    `max_retries` passes map to None.
+    """
+    budgets = {**PHASE_BUDGETS, **(budgets or {})}
+    spans = spans or PhaseSpans()
+    prices = {stay: None for stay in stays}
+
+    for attempt in range(1, max_retries + 1):
+        todo = [stay for stay in stays if prices[stay] is None]
+        if not todo:
+            break
+
+        url = reconstruct_url(room_id, *todo[0], base_url=base_url)
+        if breaker:
+            breaker.wait()
+        context = page = None
+        crashed = False
+        try:
+            with spans.span('launch', url, attempt):
+                context = pool.acquire()
+                page = context.new_page()
+            print(f"🧹 Sweep attempt {attempt}/{max_retries}: {len(todo)} stays for room {room_id}")
+            watcher = PriceResponseWatcher(page) if extract_mode == 'network' else None
+            if limiter:
+                limiter.wait(url)
+            with spans.span('goto', url, attempt):
+                load_listing(page, url, budgets)
+
+            for index, (check_in, check_out) in enumerate(todo):
+                since = watcher.mark() if watcher and index > 0 else 0
+                if index > 0:
+                    if index == 1:
+                        with spans.span('popup', url, attempt) as span:
+                            found = dismiss_popup(page, pool.popup_budget(budgets))
+                            pool.note_popup(found)
+                            if not found:
+                                span['outcome'] = 'absent'
+                    with spans.span('dates', url, attempt, check_in=check_in, check_out=check_out) as span:
+                        selected = select_dates_with_retry(page, check_in, check_out, budgets)
+                        if not selected:
+                            print(f"⚠️  Could not select {check_in} to {check_out}")
+                            span['outcome'] = 'failed'
+                    if not selected:
+                        continue
+                with spans.span('price', url, attempt, check_in=check_in, check_out=check_out) as span:
+                    price = read_stay_price(page, watcher, since, budgets)
+                    span['outcome'] = price_status(price)
+                prices[(check_in, check_out)] = price
+                print(f"{'✅' if price else '❌'} {check_in} to {check_out}: {price if price else 'Price not found'}")
+            if breaker:
+                breaker.record()
+        except Exception as e:
+            crashed = True
+            if not attempt_failed(e, f"Sweep attempt {attempt}", f"room {room_id}", breaker):
+                break
+        finally:
+            with spans.span('teardown', url, attempt):
+                try:
+                    if page:
+                        page.close()
+                except:
+                    pass
+                if context:
+                    pool.release(context, crashed)
+
+    return prices
+
+def take_snapshot(page):
+    """Read everything availability and price checks need in one round trip"""
+    return page.evaluate(SNAPSHOT_JS)
+
+def check_availability(page, snapshot=None):
+    """Check if the room is available for the selected dates"""
+    try:
+        available, indicator, _ = analyse_snapshot(snapshot or take_snapshot(page))
+        if not available:
+            print(f"🚫 Room appears unavailable (found: {indicator})")
+            return False
+
+        print("✅ Room appears to be available")
+        return True
+
+    except Exception as e:
+        print(f"⚠️  Could not check availability: {e}")
+        return True  # Assume available if we can't check
 
-    # Initialize statistics
-    stats = {
+def try_extract_price(page, snapshot=None):
+    """Extract a Price from the price nodes, the booking sidebar or the page text"""
+    try:
+        _, _, price = analyse_snapshot(snapshot or take_snapshot(page))
+    except:
+        return None
+    if price:
+        print(f"💰 Found price: {price} ({price.amount:g} {price.currency}, {price.nights or '?'} nights)")
+    return price
+
+def new_stats():
+    """Fresh statistics dict shared by the sync and async runners"""
+    return {
         'total_processed': 0,
         'successful_prices': 0,
         'not_available': 0,
         'failed_scrapes': 0,
         'skipped_invalid': 0,
+        'duplicates': 0,
+        'cache_hits': 0,
+        'seed_hits': 0,
+        'http_requests': 0,
+        'http_hits': 0,
+        'browserless': 0,  # listings answered without a page load, the scheduler refunds them
         'prices_found': []
     }
 
-    try:
-        print("🔍 Loading CSV file...")
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            headers = next(reader)  # Skip header row
+def read_seed_rows(file):
+    """Yield (row_num, row) from an open seed CSV, one row at a time"""
+    reader = csv.reader(file)
+    next(reader, None)  # Skip header row
+    yield from enumerate(reader, start=2)  # Start at 2 since row 1 is header
+
+def iter_listings(rows, stats):
+    """Yield (row_num, room_id, original_url, row) for every scrapeable CSV row"""
+    for row_num, row in rows:
+        if len(row) == 0:  # Make sure row has data
+            continue
+
+        original_url = row[0]  # URL is in the first column
+
+        if not original_url or not original_url.startswith('https://www.airbnb.com'):
+            print(f"⏭️  Skipping invalid URL in row {row_num}: {original_url}")
+            stats['skipped_invalid'] += 1
+            continue
+
+        # Extract room ID from URL
+        room_id = extract_room_id(original_url)
+        if not room_id:
+            print(f"❌ Could not extract room ID from URL: {original_url}")
+            stats['total_processed'] += 1
+            stats['failed_scrapes'] += 1
+            continue
+
+        yield row_num, room_id, original_url, row
+
+def first_sighting(first_rows, row_num, room_id, original_url, stats):
+    """True the first time a room shows up; later rows of the same room count as duplicates"""
+    if room_id in first_rows:
+        print(f"♊ Row {row_num} is room {room_id} again (first seen in row {first_rows[room_id]}), skipping")
+        stats['duplicates'] += 1
+        return False
+    first_rows[room_id] = row_num
+
+    print(f"\n📍 Processing row {row_num}:")
+    print(f"🔗 Original URL: {original_url}")
+    print(f"🏠 Room ID: {room_id}")
+    print(f"✨ Clean URL: {clean_url(original_url)}")
+    return True
+
+def dedupe_listings(listings, stats):
+    """Drop rows whose room was already seen, whatever tracking parameters they carry"""
+    first_rows = {}
+    for row_num, room_id, original_url, row in listings:
+        if first_sighting(first_rows, row_num, room_id, original_url, stats):
+            yield row_num, room_id, original_url, row
+
+def make_result(row_num, room_id, check_in, check_out, price, url, source, original_price=None):
+    """One output record; `row` is the seed CSV row it came from"""
+    structured = price if isinstance(price, Price) else None
+    return {
+        'row': row_num,
+        'room_id': room_id,
+        'check_in': check_in,
+        'check_out': check_out,
+        'price': str(price) if price else None,
+        'amount': structured.amount if structured else None,
+        'currency': structured.currency if structured else None,
+        'nights': structured.nights if structured else None,
+        'original_price': original_price,
+        'status': price_status(price),
+        'source': source,
+        'elapsed': None,
+        'url': url,
+    }
 
-            print("🚀 Starting Airbnb price scraping...")
-            print(f"📅 Using hardcoded dates: {check_in} to {check_out}")
-            print("=" * 50)
+def record_result(stats, result):
+    """Update statistics with the outcome of one listing"""
+    row_num = result['row']
+    price = result['price']
+    stats['total_processed'] += 1
+    if price == "Not Available":
+        stats['not_available'] += 1
+        print(f"🚫 Row {row_num} status: Not Available")
+    elif price and price != "Not Available":
+        stats['successful_prices'] += 1
+        # None on long runs, where the results only go to the output files and the store
+        if stats['prices_found'] is not None:
+            stats['prices_found'].append({
+                'row': row_num,
+                'room_id': result['room_id'],
+                'price': price,
+                'url': result['url']
+            })
+        print(f"💰 Row {row_num} status: Price found - {price}")
+    else:
+        stats['failed_scrapes'] += 1
+        print(f"❌ Row {row_num} status: Failed to scrape")
+
+class ResultWriter:
+    """Stream results to .csv and/or .jsonl files as they arrive
+
+    With a matrix path, sweep results are also collected per room and
+    written as one row of prices per stay once the room is complete. With
+    `append`, existing files are extended instead of replaced, and results
+    resumed from an earlier run of the session are left out as that run
+    already wrote them there; a room all of whose stays were resumed got
+    its matrix row from that run too.
+    """
+
+    def __init__(self, paths, matrix_path=None, stays=None, append=False):
+        self.append = append
+        mode = 'a' if append else 'w'
+        self.files = []
+        self.csv_writers = []
+        self.jsonl_files = []
+        self.stays = stays or []
+        self.pending = {}  # room_id -> ({stay: price}, [written, ...]) for rooms still sweeping
+        self.matrix_writer = None
+        if matrix_path and self.stays:
+            file = open(matrix_path, mode, encoding='utf-8', newline='')
+            self.files.append(file)
+            self.matrix_writer = (file, csv.writer(file))
+            if not file.tell():
+                self.matrix_writer[1].writerow(['room_id'] + [f"{a}:{b}" for a, b in self.stays])
+        for path in paths:
+            file = open(path, mode, encoding='utf-8', newline='')
+            self.files.append(file)
+            if path.endswith('.jsonl'):
+                self.jsonl_files.append(file)
+            else:
+                writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+                if not file.tell():
+                    writer.writeheader()
+                self.csv_writers.append((file, writer))
+
+    def write(self, result):
+        written = not (self.append and result['source'] == 'resumed')
+        if written:
+            for file in self.jsonl_files:
+                file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                file.flush()
+            for file, writer in self.csv_writers:
+                writer.writerow(result)
+                file.flush()
+        if self.stays:
+            self._add_to_matrix(result, written)
+
+    def _add_to_matrix(self, result, written=True):
+        prices, fresh = self.pending.setdefault(result['room_id'], ({}, []))
+        prices[(result['check_in'], result['check_out'])] = result['price']
+        fresh.append(written)
+        if len(prices) < len(self.stays):
+            return
+        del self.pending[result['room_id']]
+        if not any(fresh):
+            return
+        row = [prices.get(stay) or '' for stay in self.stays]
+        print(f"🧮 Room {result['room_id']}: " + " | ".join(price or '—' for price in row))
+        if self.matrix_writer:
+            file, writer = self.matrix_writer
+            writer.writerow([result['room_id']] + row)
+            file.flush()
+
+    def close(self):
+        for file in self.files:
+            file.close()
+
+def cached_price(store, room_id, check_in, check_out, args):
+    """(stored price or "Not Available", source) that can stand in for a scrape, else (None, None)
+
+    The source is 'resumed' for a result stored by an earlier run of the
+    same supervised session, which already wrote it to the output files.
+    """
+    if store is None or not (args.resume or args.ttl or args.resume_since):
+        return None, None
+    ttl = None if args.resume else args.ttl
+    if ttl is not None and args.resume_since:
+        # Whatever this session stored is reused, older results only within the TTL
+        ttl = max(ttl, time.time() - args.resume_since)
+    row = store.lookup(room_id, check_in, check_out, ttl=ttl)
+    if not row:
+        return None, None
+    if row['status'] == 'price':
+        price = parse_price(row['price'], stay_nights(check_in, check_out)) or row['price']
+    else:
+        price = "Not Available"
+    print(f"💾 Using stored result from {time.strftime('%Y-%m-%d %H:%M', time.localtime(row['scraped_at']))}: {price}")
+    resumed = args.resume_since and row['scraped_at'] >= args.resume_since
+    return price, 'resumed' if resumed else 'store'
+
+def listing_dates(original_url, check_in, check_out, args):
+    """Stay to price for one row: the run's dates, or the row's own with --dates-from-url"""
+    if args.dates_from_url:
+        url_in, url_out = extract_check_in_out_dates(original_url)
+        if url_in and url_out:
+            return url_in, url_out
+    return check_in, check_out
 
-            for row_num, row in enumerate(reader, start=2):  # Start at 2 since row 1 is header
-                if len(row) > 0:  # Make sure row has data
-                    original_url = row[0]  # URL is in the first column
+def seed_quote(row, original_url, check_in, check_out, args):
+    """Search-card price from the seed row if it quotes exactly the requested stay"""
+    if not args.seed_prices:
+        return None
+    if extract_check_in_out_dates(original_url) != (check_in, check_out):
+        return None
+    quote = parse_seed_price(row)
+    if not quote or quote['nights'] != stay_nights(check_in, check_out):
+        return None
+    print(f"🌱 Using seed export price: {quote['price']} for {quote['nights']} nights"
+          + (f" (originally {quote['original_price']})" if quote['original_price'] else ""))
+    return quote
+
+def listing_stays(original_url, check_in, check_out, args):
+    """Stays to price for one row: the sweep ranges, or the single stay"""
+    if args.sweep_ranges:
+        return args.sweep_ranges
+    return [listing_dates(original_url, check_in, check_out, args)]
+
+def plan_listing(row_num, room_id, original_url, row, stays, stats, args, store):
+    """Split a row's stays into results known without a browser and stays left to scrape"""
+    known = {}
+    todo = []
+    for stay_in, stay_out in stays:
+        url = reconstruct_url(room_id, stay_in, stay_out, args.base_url)
+        quote = seed_quote(row, original_url, stay_in, stay_out, args)
+        price, source = (None, None) if quote else cached_price(store, room_id, stay_in, stay_out, args)
+        if quote:
+            stats['seed_hits'] += 1
+            known[(stay_in, stay_out)] = make_result(row_num, room_id, stay_in, stay_out, quote['price'], url,
+                                                     'seed', quote['original_price'])
+        elif price:
+            stats['cache_hits'] += 1
+            known[(stay_in, stay_out)] = make_result(row_num, room_id, stay_in, stay_out, price, url, source)
+        else:
+            todo.append((stay_in, stay_out))
+    return known, todo
+
+def record_http_answer(row_num, room_id, stay, price, url, known, stats, store):
+    """Book-keeping for a stay the HTTP tier answered"""
+    stats['http_hits'] += 1
+    print(f"🪶 Answered over plain HTTP: {stay[0]} to {stay[1]}: {price}")
+    if store:
+        store.record(room_id, *stay, price, row_num, url)
+    known[stay] = make_result(row_num, room_id, *stay, price, url, 'http')
+
+def http_tier(fetcher, row_num, room_id, todo, known, stats, store, limiter=None, base_url=BASE_URL):
+    """Answer stays from the listing HTML without a browser; return the stays left for Playwright"""
+    left = []
+    for stay in todo:
+        if not fetcher.enabled:
+            left.append(stay)
+            continue
+        url = reconstruct_url(room_id, *stay, base_url=base_url)
+        if limiter:
+            limiter.wait(url)
+        stats['http_requests'] += 1
+        price = fetcher.fetch_price(url)
+        if price:
+            record_http_answer(row_num, room_id, stay, price, url, known, stats, store)
+        else:
+            left.append(stay)
+    return left
+
+def finish_listing(row_num, room_id, stays, known, prices, stats, store, base_url=BASE_URL):
+    """Store freshly scraped prices and return the row's results in stay order"""
+    results = []
+    for stay_in, stay_out in stays:
+        result = known.get((stay_in, stay_out))
+        if result is None:
+            url = reconstruct_url(room_id, stay_in, stay_out, base_url)
+            price = prices.get((stay_in, stay_out))
+            if store:
+                store.record(room_id, stay_in, stay_out, price, row_num, url)
+            result = make_result(row_num, room_id, stay_in, stay_out, price, url, 'browser')
+        record_result(stats, result)
+        results.append(result)
+    return results
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Scrape Airbnb prices for listings in a CSV export")
+    parser.add_argument('--csv', default='airbnb.csv', help="seed CSV exported from the search page")
+    parser.add_argument('--base-url', default=BASE_URL, help="host listing pages are loaded from")
+    parser.add_argument('--check-in', default='2025-11-23', help="check-in date, YYYY-MM-DD")
+    parser.add_argument('--check-out', default='2026-01-06', help="check-out date, YYYY-MM-DD")
+    parser.add_argument('--dates-from-url', action='store_true',
+                        help="price each row for the dates in its own URL instead of --check-in/--check-out")
+    parser.add_argument('--sweep', metavar='IN:OUT,...',
+                        help="price every listing for these stays in one page session each")
+    parser.add_argument('--sweep-start', help="first check-in of a generated sweep, YYYY-MM-DD")
+    parser.add_argument('--sweep-nights', type=int, default=5, help="stay length of a generated sweep")
+    parser.add_argument('--sweep-step', type=int, default=7, help="days between generated sweep check-ins")
+    parser.add_argument('--sweep-count', type=int, default=4, help="number of generated sweep stays")
+    parser.add_argument('--matrix', metavar='PATH',
+                        help="write the price-by-stay matrix of a sweep to this CSV, one row per room")
+    parser.add_argument('--seed-prices', action='store_true',
+                        help="use the price from the seed export when it quotes the requested stay")
+    parser.add_argument('--headed', dest='headless', action='store_false', default=HEADLESS,
+                        help="show the browser window (needs a display)")
+    parser.add_argument('--context-uses', type=int, default=MAX_CONTEXT_USES,
+                        help="recycle a browser context after this many listings")
+    parser.add_argument('--no-http', dest='http_tier', action='store_false',
+                        help="skip the plain HTTP fetch of the listing page and always use the browser")
+    parser.add_argument('--storage-state', metavar='PATH',
+                        help="load and save cookies, localStorage and consent between runs in this JSON file")
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help="run Chromium on this persistent profile so its HTTP cache survives listings and runs")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="scrape several listings at once with playwright.async_api")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="listings in flight at once in --async mode")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="shard listings across this many processes, one browser each, sharing --rpm")
+    parser.add_argument('--rpm', type=float, default=DEFAULT_RPM,
+                        help="page loads per minute allowed per host")
+    parser.add_argument('--extract', choices=['network', 'dom'], default='network',
+                        help="read prices from the booking API response (falls back to DOM) or the DOM only")
+    parser.add_argument('--output', action='append', default=[], metavar='PATH',
+                        help="stream results to a .csv or .jsonl file as they finish (repeatable)")
+    parser.add_argument('--db', default=DEFAULT_DB, help="SQLite file results are written to")
+    parser.add_argument('--ttl', type=float, default=DEFAULT_CACHE_TTL,
+                        help="reuse stored results younger than this many seconds (0 disables)")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip every row that already has a completed result, whatever its age")
+    parser.add_argument('--schedule', type=int, metavar='LOADS',
+                        help="re-price only the LOADS listings most likely to have changed, by stored history")
+    parser.add_argument('--budget', action='append', default=[], metavar='PHASE=MS',
+                        help=f"override a phase latency budget, phases: {', '.join(PHASE_BUDGETS)} (repeatable)")
+    parser.add_argument('--breaker-threshold', type=float, default=0.5,
+                        help="share of recent attempts failing that pauses the run (0 disables)")
+    parser.add_argument('--breaker-cooldown', type=float, default=60,
+                        help="seconds the run pauses when the circuit breaker opens, doubling on repeat trips")
+    parser.add_argument('--spans', metavar='PATH',
+                        help="append a JSONL record for every timed scrape phase to this file")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="write per-phase latency histograms in Prometheus text format to this file")
+    parser.add_argument('--long-run', action='store_true',
+                        help="supervised mode for unattended runs: bounded memory, browser relaunches, "
+                             "results only streamed, restart where it stopped at the memory cap")
+    parser.add_argument('--max-rss', type=float, default=PYTHON_RSS_CAP_MB, metavar='MB',
+                        help="--long-run: RSS cap of the Python process")
+    parser.add_argument('--browser-rss', type=float, default=BROWSER_RSS_CAP_MB, metavar='MB',
+                        help="--long-run: relaunch the browser once Playwright and Chromium use more than this")
+    parser.add_argument('--browser-listings', type=int, default=BROWSER_MAX_LISTINGS,
+                        help="--long-run: relaunch the browser after this many listings (0 disables)")
+    parser.add_argument('--no-block', dest='block', action='store_false',
+                        help="load every resource instead of aborting images, fonts and trackers")
+    parser.add_argument('--block-types', default=','.join(BLOCKED_RESOURCE_TYPES),
+                        help="comma separated resource types to abort")
+    parser.add_argument('--allow', action='append', default=[], metavar='PATTERN',
+                        help="URL fragment that is never blocked (repeatable)")
+    parser.add_argument('--deny', action='append', default=[], metavar='PATTERN',
+                        help="extra URL fragment to block (repeatable)")
+    args = parser.parse_args(argv)
+    if args.long_run and args.use_async:
+        parser.error("--long-run relaunches the browser between listings, which --async keeps several of in flight")
+    args.base_url = args.base_url.rstrip('/')
+    args.append_output = False  # set by the supervisor when a later run resumes an earlier one
+    args.resume_since = None    # set with it: when the supervised session started
+    args.budgets = {}
+    for item in args.budget:
+        phase, _, ms = item.partition('=')
+        if phase not in PHASE_BUDGETS or not ms.isdigit():
+            parser.error(f"invalid --budget {item!r}, expected PHASE=MS with PHASE in {', '.join(PHASE_BUDGETS)}")
+        args.budgets[phase] = int(ms)
+
+    args.sweep_ranges = None
+    try:
+        if args.sweep:
+            args.sweep_ranges = parse_sweep_ranges(args.sweep)
+        elif args.sweep_start:
+            args.sweep_ranges = sweep_date_ranges(args.sweep_start, args.sweep_nights, args.sweep_step,
+                                                  args.sweep_count)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def build_route_policy(args):
+    """RoutePolicy from the command line, or None when blocking is off"""
+    if not args.block:
+        return None
+    blocked_types = [t.strip() for t in args.block_types.split(',') if t.strip()]
+    return RoutePolicy(blocked_types=blocked_types,
+                       deny=DENY_PATTERNS + tuple(args.deny),
+                       allow=ALLOW_PATTERNS + tuple(args.allow))
+
+def scrape_listings(listings, check_in, check_out, stats, args, limiter, route_policy=None, store=None,
+                    spans=None, breaker=None):
+    """Scrape listings one after another on a shared browser pool, yielding results
+
+    On --long-run a Supervisor checks memory after every listing, relaunches
+    the browser on its thresholds and raises MemoryCapExceeded at the cap.
+    """
+    fetcher = HttpFetcher() if args.http_tier else None
+    supervisor = build_supervisor(args)
+    with sync_playwright() as playwright:
+        pool = BrowserPool(playwright, headless=args.headless, max_context_uses=args.context_uses,
+                           route_policy=route_policy, storage_state=args.storage_state,
+                           profile_dir=args.profile_dir)
+        try:
+            for row_num, room_id, original_url, row in listings:
+                start_time = time.monotonic()
+                stays = listing_stays(original_url, check_in, check_out, args)
+                known, todo = plan_listing(row_num, room_id, original_url, row, stays, stats, args, store)
+                if fetcher:
+                    todo = http_tier(fetcher, row_num, room_id, todo, known, stats, store, limiter, args.base_url)
+                if not todo:
+                    stats['browserless'] += 1
+
+                prices = {}
+                if len(todo) == 1:
+                    url_to_scrape = reconstruct_url(room_id, *todo[0], base_url=args.base_url)
+                    print(f"🎯 Starting price scraping: {url_to_scrape}")
+                    prices[todo[0]] = scrape_airbnb_price(url_to_scrape, *todo[0], pool=pool, limiter=limiter,
+                                                          extract_mode=args.extract, budgets=args.budgets,
+                                                          spans=spans, breaker=breaker)
+                elif todo:
+                    prices = sweep_airbnb_prices(room_id, todo, pool, limiter=limiter,
+                                                 extract_mode=args.extract, budgets=args.budgets, spans=spans,
+                                                 breaker=breaker, base_url=args.base_url)
+
+                for result in finish_listing(row_num, room_id, stays, known, prices, stats, store, args.base_url):
+                    result['elapsed'] = round(time.monotonic() - start_time, 3)
+                    yield result
+                print("-" * 30)
+                if supervisor:
+                    supervisor.check(pool)
+        finally:
+            if supervisor:
+                supervisor.close(pool)
+                stats['supervisor'] = supervisor.counters()
+            else:
+                pool.close()
+            if fetcher:
+                fetcher.close()
 
-                    if not original_url or not original_url.startswith('https://www.airbnb.com'):
-                        print(f"⏭️  Skipping invalid URL in row {row_num}: {original_url}")
-                        stats['skipped_invalid'] += 1
-                        continue
+def main():
+    """Main function to read CSV and process URLs"""
+    args = parse_args()
+    if args.long_run:
+        sys.exit(supervise(run, args))
+    run(args)
+
+def run(args, source=None):
+    """Scrape every listing in the seed CSV with the given options and return the stats
+
+    `source`, if given, replaces the seed CSV: a callable taking (stats,
+    limiter) and returning an async iterable of (row_num, room_id, url, row)
+    listings, like the search crawler in crowle_airbnb.py. Its listings are
+    priced on the --async pipeline while the source is still producing, so
+    --workers, --schedule and --long-run do not apply to it.
+    """
+    if source is not None and (args.workers > 1 or args.schedule or args.long_run):
+        raise ValueError("--workers, --schedule and --long-run need a seed CSV, not a listing source")
+    csv_file = args.csv
+    check_in = args.check_in
+    check_out = args.check_out
+
+    stats = new_stats()
+    if args.long_run:
+        stats['prices_found'] = None
+    limiter = RateLimiter(args.rpm)
+    route_policy = build_route_policy(args)
+    spans = PhaseSpans(args.spans, window=SPAN_WINDOW if args.long_run else None)
+    breaker = CircuitBreaker(threshold=args.breaker_threshold, cooldown=args.breaker_cooldown)
+    store = ResultStore(args.db)
+    writer = ResultWriter(args.output, args.matrix, args.sweep_ranges, append=args.append_output)
 
-                    stats['total_processed'] += 1
-                    print(f"\n📍 Processing row {row_num}:")
-                    print(f"🔗 Original URL: {original_url}")
+    try:
+        if source is None:
+            print("🔍 Loading CSV file...")
+        with open(csv_file, 'r', encoding='utf-8') if source is None else contextlib.nullcontext() as file:
+            print("🚀 Starting Airbnb price scraping...")
+            if args.sweep_ranges:
+                print(f"🧹 Sweeping {len(args.sweep_ranges)} stays per listing: "
+                      + ", ".join(f"{a} to {b}" for a, b in args.sweep_ranges))
+            elif args.dates_from_url:
+                print("📅 Using each row's own dates from its URL")
+            else:
+                print(f"📅 Using dates: {check_in} to {check_out}")
+            print(f"⏱️  Rate limit: {args.rpm:g} page loads/min per host")
+            print("=" * 50)
 
-                    # Extract room ID from URL
-                    room_id = extract_room_id(original_url)
-                    if not room_id:
-                        print(f"❌ Could not extract room ID from URL: {original_url}")
-                        stats['failed_scrapes'] += 1
-                        continue
+            if source is not None:
+                # produce -> dedupe -> scrape -> write, pricing starts with the first listing produced
+                import asyncio
+                from airbnb_async import dedupe_listings_async, scrape_listings_async, write_results_async
+                listings = dedupe_listings_async(source(stats, limiter), stats)
+                results = scrape_listings_async(listings, check_in, check_out, stats, args, limiter,
+                                                route_policy, store, spans, breaker)
+                asyncio.run(write_results_async(results, writer))
+            else:
+                # read -> validate -> dedupe -> scrape -> write, one row in flight per stage
+                listings = dedupe_listings(iter_listings(read_seed_rows(file), stats), stats)
+                if args.schedule:
+                    # Most-likely-changed listings first, within a fixed number of page loads
+                    listings = schedule_listings(
+                        listings, lambda url: listing_stays(url, check_in, check_out, args), store,
+                        args.schedule, stats)
+                if args.workers > 1:
+                    from airbnb_workers import scrape_listings_sharded
+                    print(f"👷 Sharding listings across {args.workers} worker processes")
+                    for result in scrape_listings_sharded(listings, check_in, check_out, stats, args,
+                                                          route_policy, spans, breaker):
+                        writer.write(result)
+                elif args.use_async:
+                    import asyncio
+                    from airbnb_async import scrape_listings_async, write_results_async
+                    results = scrape_listings_async(listings, check_in, check_out, stats, args, limiter,
+                                                    route_policy, store, spans, breaker)
+                    asyncio.run(write_results_async(results, writer))
+                else:
+                    for result in scrape_listings(listings, check_in, check_out, stats, args, limiter,
+                                                  route_policy, store, spans, breaker):
+                        writer.write(result)
 
-                    print(f"🏠 Room ID: {room_id}")
-                    print(f"📅 Using hardcoded dates: {check_in}, {check_out}")
-
-                    # Create clean URL for navigation
-                    clean_url_to_use = clean_url(original_url)
-                    print(f"✨ Clean URL: {clean_url_to_use}")
-
-                    # Reconstruct URL with room ID and hardcoded dates
-                    reconstructed_url = reconstruct_url(room_id, check_in, check_out)
-                    print(f"🔧 Reconstructed URL: {reconstructed_url}")
-
-                    # Use reconstructed URL for scraping
-                    url_to_scrape = reconstructed_url
-
-                    # Scrape price
-                    print("🎯 Starting price scraping...")
-                    price = scrape_airbnb_price(url_to_scrape, check_in, check_out)
-
-                    # Update statistics
-                    if price == "Not Available":
-                        stats['not_available'] += 1
-                        print(f"🚫 Status: Not Available")
-                    elif price and price != "Not Available":
-                        stats['successful_prices'] += 1
-                        stats['prices_found'].append({
-                            'row': row_num,
-                            'room_id': room_id,
-                            'price': price,
-                            'url': url_to_scrape
-                        })
-                        print(f"💰 Status: Price found - {price}")
-                    else:
-                        stats['failed_scrapes'] += 1
-                        print(f"❌ Status: Failed to scrape")
-
-                    print(f"💵 Final price: {price if price else 'Not found'}")
-                    print("-" * 30)
-
-                    # Wait longer between requests to be respectful and avoid rate limiting
-                    wait_time = 5 + (row_num % 3) * 2  # 5-9 seconds with some variation
-                    print(f"⏳ Waiting {wait_time} seconds before next request...")
-                    time.sleep(wait_time)
+        if route_policy:
+            stats['routing'] = route_policy.counters()
+        stats['phases'] = spans.summary()
+        stats['breaker'] = breaker.counters()
+        if args.metrics:
+            spans.write_prometheus(args.metrics)
 
         # Print summary statistics
         print_summary(stats, check_in, check_out)
 
+    except MemoryCapExceeded as e:
+        print(f"🧠 {e}, stopping here for a fresh process to resume")
+        stats['memory_cap'] = str(e)
     except FileNotFoundError:
         print(f"❌ Error: File '{csv_file}' not found")
     except Exception as e:
         print(f"❌ Error reading CSV file: {e}")
+    finally:
+        writer.close()
+        spans.close()
+        store.close()
+
+    return stats
 
 def print_summary(stats, check_in, check_out):
     """Print comprehensive summary of scraping results"""
@@ -411,10 +1389,22 @@ def print_summary(stats, check_in, check_out):
     print(f"📅 Dates checked: {check_in} to {check_out}")
     print(f"🔗 Total URLs processed: {stats['total_processed']}")
     print(f"⏭️  Skipped invalid URLs: {stats['skipped_invalid']}")
+    print(f"♊ Skipped duplicate rooms: {stats.get('duplicates', 0)}")
     print("-" * 60)
     print(f"✅ Successful price extraction: {stats['successful_prices']}")
     print(f"🚫 Rooms not available: {stats['not_available']}")
     print(f"❌ Failed scrapes: {stats['failed_scrapes']}")
+    if stats.get('cache_hits'):
+        print(f"💾 Served from result store: {stats['cache_hits']}")
+    if stats.get('seed_hits'):
+        print(f"🌱 Served from seed export: {stats['seed_hits']}")
+    if stats.get('deferred'):
+        print(f"🗓️  Deferred by the scheduler: {stats['deferred']}")
+    if stats.get('past_stays'):
+        print(f"🗓️  Left out with stays already started: {stats['past_stays']}")
+    if stats.get('http_requests'):
+        print(f"🪶 Answered over plain HTTP: {stats['http_hits']}/{stats['http_requests']} "
+              f"({stats['http_hits'] / stats['http_requests'] * 100:.0f}% hit rate)")
     print("-" * 60)
 
     # Calculate success rate
@@ -427,8 +1417,47 @@ def print_summary(stats, check_in, check_out):
         print(f"🚫 Unavailability rate: {availability_rate:.1f}%")
         print(f"❌ Failure rate: {failure_rate:.1f}%")
 
+    # Show what request blocking saved
+    if stats.get('routing'):
+        routing = stats['routing']
+        total = routing['allowed_requests'] + routing['blocked_requests']
+        print(f"🛑 Blocked requests: {routing['blocked_requests']}/{total} "
+              f"(~{routing['bytes_saved'] / 1_000_000:.1f} MB saved)")
+        for resource_type, count in sorted(routing['blocked_by_type'].items()):
+            print(f"   {resource_type}: {count}")
+        print("-" * 60)
+
+    # Show why attempts failed
+    if stats.get('breaker') and (stats['breaker']['failures'] or stats['breaker']['trips']):
+        breaker = stats['breaker']
+        print(f"🔌 Failed attempts by class (circuit breaker trips: {breaker['trips']}):")
+        for kind, count in sorted(breaker['failures'].items(), key=lambda item: -item[1]):
+            print(f"   {kind}: {count}")
+        print("-" * 60)
+
+    # Show where the time went, phase by phase
+    if stats.get('phases'):
+        print("⏱️  Phase latency (count, p50, p95, total):")
+        for phase, summary in stats['phases'].items():
+            outcomes = ", ".join(f"{outcome} {count}" for outcome, count in summary['outcomes'].items())
+            print(f"   {phase:<12} {summary['count']:>4}  p50 {summary['p50']:.2f}s  p95 {summary['p95']:.2f}s  "
+                  f"total {summary['sum']:.1f}s  [{outcomes}]")
+            for line in format_histogram(summary):
+                print(f"      {line}")
+        print("-" * 60)
+
+    # Show what kept a long run in its memory budget
+    if stats.get('supervisor'):
+        supervisor = stats['supervisor']
+        print(f"🩺 Supervisor: {supervisor['recycles']} browser relaunches, {supervisor['killed']} stray Chromium "
+              f"processes killed, peak RSS {supervisor['peak_python_mb']} MB Python / "
+              f"{supervisor['peak_browser_mb']} MB browser")
+        print("-" * 60)
+
     # Show found prices
-    if stats['prices_found']:
+    if stats['prices_found'] is None:
+        print(f"\n💰 {stats['successful_prices']} prices streamed to the output files and the result store")
+    elif stats['prices_found']:
         print(f"\n💰 PRICES FOUND ({len(stats['prices_found'])} listings):")
         print("-" * 40)
         for i, item in enumerate(stats['prices_found'], 1):
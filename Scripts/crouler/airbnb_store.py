@@ -0,0 +1,113 @@
+import sqlite3
+import time
+
+DEFAULT_DB = 'airbnb_results.sqlite'
+DEFAULT_CACHE_TTL = 6 * 3600  # seconds a scraped price stays fresh
+
+# Statuses that mean the listing does not need scraping again
+COMPLETED_STATUSES = ('price', 'not_available')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    room_id    TEXT NOT NULL,
+    check_in   TEXT NOT NULL,
+    check_out  TEXT NOT NULL,
+    price      TEXT,
+    status     TEXT NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    scraped_at REAL NOT NULL,
+    row_num    INTEGER,
+    url        TEXT,
+    PRIMARY KEY (room_id, check_in, check_out)
+)
+"""
+
+# Every scrape ever recorded, for the re-pricing scheduler
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    room_id    TEXT NOT NULL,
+    check_in   TEXT NOT NULL,
+    check_out  TEXT NOT NULL,
+    amount     REAL,
+    currency   TEXT,
+    status     TEXT NOT NULL,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_stay ON history (room_id, check_in, check_out, scraped_at);
+"""
+
+def price_status(price):
+    """Map a scrape_airbnb_price return value to a stored status"""
+    if price == "Not Available":
+        return 'not_available'
+    if price:
+        return 'price'
+    return 'failed'
+
+class ResultStore:
+    """SQLite table of scrape results keyed by (room_id, check_in, check_out)"""
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.executescript(HISTORY_SCHEMA)
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(history)")}
+        if 'currency' not in columns:  # history tables from before currencies were kept
+            self.conn.execute("ALTER TABLE history ADD COLUMN currency TEXT")
+        self.conn.commit()
+
+    def get(self, room_id, check_in, check_out):
+        row = self.conn.execute(
+            "SELECT * FROM results WHERE room_id = ? AND check_in = ? AND check_out = ?",
+            (room_id, check_in or '', check_out or '')).fetchone()
+        return dict(row) if row else None
+
+    def lookup(self, room_id, check_in, check_out, ttl=DEFAULT_CACHE_TTL):
+        """Return the stored result if it is completed and younger than `ttl` seconds
+
+        ttl=None accepts any completed result regardless of age (--resume).
+        """
+        row = self.get(room_id, check_in, check_out)
+        if not row or row['status'] not in COMPLETED_STATUSES:
+            return None
+        if ttl is not None and time.time() - row['scraped_at'] > ttl:
+            return None
+        return row
+
+    def record(self, room_id, check_in, check_out, price, row_num=None, url=None):
+        """Write one result as soon as it is known; attempts count every scrape of the stay"""
+        now = time.time()
+        self.conn.execute(
+            """
+            INSERT INTO results (room_id, check_in, check_out, price, status, attempts, scraped_at, row_num, url)
+            VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)
+            ON CONFLICT (room_id, check_in, check_out) DO UPDATE SET
+                price = excluded.price,
+                status = excluded.status,
+                attempts = results.attempts + 1,
+                scraped_at = excluded.scraped_at,
+                row_num = excluded.row_num,
+                url = excluded.url
+            """,
+            (room_id, check_in or '', check_out or '', str(price) if price and price != "Not Available" else None,
+             price_status(price), now, row_num, url))
+        self.conn.execute(
+            "INSERT INTO history (room_id, check_in, check_out, amount, currency, status, scraped_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (room_id, check_in or '', check_out or '', getattr(price, 'amount', None), getattr(price, 'currency', None),
+             price_status(price), now))
+        self.conn.commit()
+
+    def history(self, room_id, check_in, check_out, limit=20):
+        """Most recent scrapes of a stay, newest first, as dicts with amount, status and scraped_at"""
+        rows = self.conn.execute(
+            "SELECT amount, status, scraped_at FROM history WHERE room_id = ? AND check_in = ? AND check_out = ? "
+            "ORDER BY scraped_at DESC LIMIT ?",
+            (room_id, check_in or '', check_out or '', limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,254 @@
+import gc
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+# Defaults of the --long-run thresholds
+PYTHON_RSS_CAP_MB = 768      # Python process; above it after a gc the run restarts itself
+BROWSER_RSS_CAP_MB = 1500    # Playwright driver plus Chromium; above it the browser is relaunched
+BROWSER_MAX_LISTINGS = 250   # listings one browser serves before it is relaunched anyway
+SPAN_WINDOW = 5000           # latest durations kept per phase, so histograms stay bounded
+
+REAP_EVERY = 50          # listings between scans for orphaned Chromium processes
+KILL_GRACE = 3.0         # seconds a closed browser gets to exit before it is killed
+RESTART_EXIT_CODE = 75   # EX_TEMPFAIL: the run stopped at its memory cap and wants a fresh process
+MIN_CHILD_SECONDS = 60   # a run that hits its cap sooner than this made no real progress
+MAX_QUICK_RESTARTS = 3
+
+BROWSER_NAMES = ('chrome', 'chromium', 'headless_shell')
+# Only Playwright launches Chromium with this flag, so the user's own browser is never touched
+PLAYWRIGHT_FLAG = b'--remote-debugging-pipe'
+
+class MemoryCapExceeded(Exception):
+    """The Python process stayed above its RSS cap after a collection"""
+
+def rss_bytes(pid):
+    """Resident memory of one process in bytes, 0 if it is gone (Linux /proc)"""
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return 0
+
+def descendants(pid):
+    """Pids of every live descendant of `pid`"""
+    found = []
+    pending = [pid]
+    while pending:
+        parent = pending.pop()
+        try:
+            for task in os.listdir(f'/proc/{parent}/task'):
+                with open(f'/proc/{parent}/task/{task}/children') as file:
+                    children = [int(child) for child in file.read().split()]
+                found.extend(children)
+                pending.extend(children)
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return found
+
+def process_tree_rss(pid=None):
+    """Resident memory in bytes of a process (default: this one) and all its descendants"""
+    pid = pid or os.getpid()
+    return sum(rss_bytes(each) for each in [pid] + descendants(pid))
+
+def _stat(pid):
+    """(command name, parent pid) of a process, or None if it is gone"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as file:
+            data = file.read()
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    # The name is in parentheses and may itself contain spaces or parentheses
+    name = data[data.index(b'(') + 1:data.rindex(b')')].decode(errors='replace')
+    return name, int(data[data.rindex(b')') + 2:].split()[1])
+
+def is_browser(pid):
+    stat = _stat(pid)
+    return bool(stat) and stat[0].startswith(BROWSER_NAMES)
+
+def browser_pids(pid=None):
+    """Chromium processes among the descendants of a process (default: this one)"""
+    return [each for each in descendants(pid or os.getpid()) if is_browser(each)]
+
+def orphaned_browsers():
+    """Playwright-launched Chromium main processes of this user whose driver is gone
+
+    Chromium's main process is a child of the Playwright driver; when the
+    driver dies first it is reparented to init or a subreaper and lives on.
+    """
+    orphans = []
+    uid = os.getuid()
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        stat = _stat(pid)
+        if not stat or not stat[0].startswith(BROWSER_NAMES):
+            continue
+        try:
+            if os.stat(f'/proc/{pid}').st_uid != uid:
+                continue
+            with open(f'/proc/{pid}/cmdline', 'rb') as file:
+                if PLAYWRIGHT_FLAG not in file.read():
+                    continue
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+        parent = _stat(stat[1])
+        if not parent or not (parent[0].startswith(BROWSER_NAMES) or parent[0] == 'node'):
+            orphans.append(pid)
+    return orphans
+
+def kill_tree(pid):
+    """SIGKILL a process and its descendants, children first; returns how many were signalled"""
+    killed = 0
+    for each in descendants(pid)[::-1] + [pid]:
+        try:
+            os.kill(each, signal.SIGKILL)
+            killed += 1
+        except (ProcessLookupError, PermissionError):
+            pass
+    return killed
+
+def reap_orphans():
+    """Kill orphaned Playwright Chromium trees, returning the number of processes killed"""
+    killed = sum(kill_tree(pid) for pid in orphaned_browsers())
+    if killed:
+        print(f"🧟 Killed {killed} orphaned Chromium processes")
+    return killed
+
+class Supervisor:
+    """Keep a long scrape inside its memory budget, checked between listings
+
+    The browser side (Playwright driver and Chromium) is relaunched after
+    `browser_listings` listings or once its RSS passes `browser_rss_mb`;
+    Chromium processes that outlive the close are killed. When the Python
+    process stays above `python_rss_mb` after a collection, check() raises
+    MemoryCapExceeded so the run can hand over to a fresh process.
+    """
+
+    def __init__(self, python_rss_mb=PYTHON_RSS_CAP_MB, browser_rss_mb=BROWSER_RSS_CAP_MB,
+                 browser_listings=BROWSER_MAX_LISTINGS):
+        self.python_cap = python_rss_mb * 1_000_000
+        self.browser_cap = browser_rss_mb * 1_000_000
+        self.browser_listings = browser_listings
+        self.listings = 0
+        self.listings_on_browser = 0
+        self.recycles = 0
+        self.killed = 0
+        self.peak_python = 0
+        self.peak_browser = 0
+
+    def check(self, pool):
+        """Account for one finished listing and enforce the caps"""
+        self.listings += 1
+        # Only listings the browser actually served count towards relaunching it
+        self.listings_on_browser = self.listings_on_browser + 1 if pool.browser or pool.persistent else 0
+        python_rss = rss_bytes(os.getpid())
+        browser_rss = process_tree_rss() - python_rss
+        self.peak_python = max(self.peak_python, python_rss)
+        self.peak_browser = max(self.peak_browser, browser_rss)
+
+        if self.browser_listings and self.listings_on_browser >= self.browser_listings:
+            self.recycle(pool, f"served {self.listings_on_browser} listings")
+        elif self.browser_cap and browser_rss > self.browser_cap:
+            self.recycle(pool, f"browser RSS {browser_rss / 1_000_000:.0f} MB over the cap")
+        elif self.listings % REAP_EVERY == 0:
+            self.killed += reap_orphans()
+
+        if self.python_cap and python_rss > self.python_cap:
+            gc.collect()
+            python_rss = rss_bytes(os.getpid())
+            if python_rss > self.python_cap:
+                raise MemoryCapExceeded(f"Python RSS {python_rss / 1_000_000:.0f} MB over the "
+                                        f"{self.python_cap / 1_000_000:.0f} MB cap after {self.listings} listings")
+
+    def recycle(self, pool, reason):
+        """Close the browser so the next listing launches a fresh one, killing whatever survives"""
+        pids = browser_pids()
+        print(f"♻️  Relaunching the browser: {reason}")
+        pool.close()
+        self.recycles += 1
+        self.listings_on_browser = 0
+        self.killed += self.kill_survivors(pids)
+
+    def kill_survivors(self, pids):
+        """SIGKILL browser processes from `pids` still running after KILL_GRACE"""
+        deadline = time.monotonic() + KILL_GRACE
+        alive = pids
+        while alive and time.monotonic() < deadline:
+            time.sleep(0.1)
+            alive = [pid for pid in alive if is_browser(pid)]
+        killed = sum(kill_tree(pid) for pid in alive)
+        if killed:
+            print(f"🧟 Killed {killed} Chromium processes that outlived their browser")
+        return killed
+
+    def close(self, pool):
+        """Close the pool for good, killing any Chromium it leaves behind"""
+        pids = browser_pids()
+        pool.close()
+        self.killed += self.kill_survivors(pids)
+
+    def counters(self):
+        return {
+            'listings': self.listings,
+            'recycles': self.recycles,
+            'killed': self.killed,
+            'peak_python_mb': round(self.peak_python / 1_000_000, 1),
+            'peak_browser_mb': round(self.peak_browser / 1_000_000, 1),
+        }
+
+def build_supervisor(args):
+    """Supervisor from the command line, or None outside --long-run"""
+    if not args.long_run:
+        return None
+    return Supervisor(args.max_rss, args.browser_rss, args.browser_listings)
+
+def _supervised_run(run, args):
+    stats = run(args)
+    sys.exit(RESTART_EXIT_CODE if stats.get('memory_cap') else 0)
+
+def supervise(run, args):
+    """Call run(args) in child processes, starting a fresh one each time a run stops at its memory cap
+
+    Later runs reuse whatever the session stored since it started, on top
+    of the usual --ttl, and append to the --output files, so the results
+    of a 24-hour crawl end up in one place. Chromium left over by a child
+    that died is killed before the next one starts.
+    """
+    session_started = time.time()
+    quick_restarts = 0
+    generation = 1
+    while True:
+        started = time.monotonic()
+        process = multiprocessing.Process(target=_supervised_run, args=(run, args), name=f"airbnb-run-{generation}")
+        process.start()
+        print(f"🩺 Supervised run {generation} started (pid {process.pid})")
+        try:
+            process.join()
+        except KeyboardInterrupt:
+            # The child got the same Ctrl-C; give it a moment to close its files
+            print("🛑 Interrupted, stopping the supervised run")
+            process.join(KILL_GRACE)
+            return 130
+        finally:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            reap_orphans()
+        if process.exitcode != RESTART_EXIT_CODE:
+            print(f"🩺 Supervised run {generation} finished (exit code {process.exitcode})")
+            return process.exitcode
+        quick_restarts = quick_restarts + 1 if time.monotonic() - started < MIN_CHILD_SECONDS else 0
+        if quick_restarts >= MAX_QUICK_RESTARTS:
+            print(f"❌ Hit the memory cap {quick_restarts} times in a row within {MIN_CHILD_SECONDS}s, "
+                  "raise --max-rss")
+            return process.exitcode
+        args.resume_since = session_started
+        args.append_output = True
+        generation += 1
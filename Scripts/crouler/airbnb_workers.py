@@ -0,0 +1,238 @@
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+import airbnb_scraper
+from airbnb_errors import CircuitBreaker
+from airbnb_metrics import PhaseSpans
+from airbnb_scraper import (
+    build_route_policy,
+    listing_stays,
+    make_result,
+    new_stats,
+    reconstruct_url,
+    record_result,
+    scrape_listings,
+)
+from airbnb_store import ResultStore
+from airbnb_supervisor import RESTART_EXIT_CODE, SPAN_WINDOW, MemoryCapExceeded
+
+MAX_SHARD_RESTARTS = 2  # times a listing may be in flight when its worker dies before it is given up
+
+class SharedRateLimiter:
+    """RateLimiter whose budget is shared by every worker process
+
+    All listings live on one host, so a single schedule of page-load slots
+    `60 / rpm` seconds apart is kept in shared memory; each reservation
+    takes the next free slot.
+    """
+
+    def __init__(self, rpm=airbnb_scraper.DEFAULT_RPM):
+        self.interval = 60.0 / rpm
+        self.next_slot = multiprocessing.Value('d', 0.0)
+
+    def reserve(self, url):
+        """Take the next page-load slot and return seconds to wait for it"""
+        with self.next_slot.get_lock():
+            now = time.time()
+            slot = max(now, self.next_slot.value)
+            self.next_slot.value = slot + self.interval
+        return slot - now
+
+    def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            print(f"⏳ Rate limit: waiting {delay:.1f}s before next page load...")
+            time.sleep(delay)
+
+class SharedCircuitBreaker(CircuitBreaker):
+    """CircuitBreaker whose open state is shared by every worker process
+
+    Each worker judges its own recent attempts, but a trip in any of them
+    pauses page loads in all of them, as they all load from the same host.
+    """
+
+    def __init__(self, threshold=0.5, cooldown=60):
+        self.shared_until = multiprocessing.Value('d', 0.0)
+        super().__init__(threshold=threshold, cooldown=cooldown)
+
+    @property
+    def open_until(self):
+        return self.shared_until.value
+
+    @open_until.setter
+    def open_until(self, value):
+        with self.shared_until.get_lock():
+            self.shared_until.value = max(self.shared_until.value, value)
+
+def shard_worker(worker_id, shard, check_in, check_out, args, limiter, breaker, results):
+    """Process entry point: scrape one shard on its own browser and report back over `results`"""
+    if args.profile_dir:
+        # Chromium locks a profile, so every worker keeps its own under the shared directory
+        args.profile_dir = os.path.join(args.profile_dir, f"worker-{worker_id}")
+    stats = new_stats()
+    route_policy = build_route_policy(args)
+    spans = PhaseSpans(args.spans, window=SPAN_WINDOW if args.long_run else None)
+    store = ResultStore(args.db)
+    try:
+        if args.use_async:
+            import asyncio
+            from airbnb_async import scrape_listings_async
+
+            async def drain():
+                async for result in scrape_listings_async(iter(shard), check_in, check_out, stats, args, limiter,
+                                                          route_policy, store, spans, breaker):
+                    results.put(('result', worker_id, result))
+            asyncio.run(drain())
+        else:
+            for result in scrape_listings(iter(shard), check_in, check_out, stats, args, limiter, route_policy,
+                                          store, spans, breaker):
+                results.put(('result', worker_id, result))
+    except MemoryCapExceeded as e:
+        # Not a crash: the rest of the shard goes to a fresh process without counting against the listing
+        print(f"🧠 Worker {worker_id}: {e}")
+        sys.exit(RESTART_EXIT_CODE)
+    finally:
+        spans.close()
+        store.close()
+    results.put(('done', worker_id, {
+        'durations': spans.durations,
+        'outcomes': spans.outcomes,
+        'breaker': breaker.counters(),
+        'routing': route_policy.counters() if route_policy else None,
+        'http_requests': stats['http_requests'],
+    }))
+
+def merge_worker_report(report, stats, spans, breaker, route_policy):
+    """Fold a finished worker's timings and counters into the parent's"""
+    stats['http_requests'] += report['http_requests']
+    spans.merge(report['durations'], report['outcomes'])
+    breaker.trips += report['breaker']['trips']
+    for kind, count in report['breaker']['failures'].items():
+        breaker.counts[kind] = breaker.counts.get(kind, 0) + count
+    if route_policy and report['routing']:
+        route_policy.merge(report['routing'])
+
+def scrape_listings_sharded(listings, check_in, check_out, stats, args, route_policy=None, spans=None,
+                            breaker=None):
+    """Scrape listings on `args.workers` processes, one browser each, yielding results per finished row
+
+    Listings are dealt round-robin into one shard per worker. Workers share
+    a single rate budget and circuit breaker and report results as they finish; a row's results
+    are yielded once all its stays are in, so a worker that dies never
+    leaves half a row behind. The unfinished part of a dead worker's shard
+    is handed to a fresh process.
+    """
+    spans = spans or PhaseSpans()
+    breaker = breaker or CircuitBreaker()
+    limiter = SharedRateLimiter(args.rpm)
+    shared_breaker = SharedCircuitBreaker(threshold=args.breaker_threshold, cooldown=args.breaker_cooldown)
+    results = multiprocessing.Queue()
+
+    listings = list(listings)
+    shards = [listings[i::args.workers] for i in range(args.workers)]
+    # row_num -> number of results still to come for the row; finished rows are removed
+    expected = {row_num: len(listing_stays(original_url, check_in, check_out, args))
+                for row_num, _, original_url, _ in listings}
+    received = {}  # row_num -> results so far, for rows still in `expected`
+    crashes = {}   # row_num -> times its worker died while it was unfinished
+    workers = {}   # worker_id -> (process, shard)
+
+    def start(worker_id, shard):
+        process = multiprocessing.Process(target=shard_worker, name=f"airbnb-worker-{worker_id}",
+                                          args=(worker_id, shard, check_in, check_out, args, limiter, shared_breaker,
+                                                results))
+        process.start()
+        workers[worker_id] = (process, shard)
+        print(f"👷 Worker {worker_id} started (pid {process.pid}) with {len(shard)} listings")
+
+    def handle(message):
+        kind, worker_id, payload = message
+        if kind == 'done':
+            merge_worker_report(payload, stats, spans, breaker, route_policy)
+            process, _ = workers.pop(worker_id)
+            process.join()
+            return []
+        row_num = payload['row']
+        received.setdefault(row_num, []).append(payload)
+        if len(received[row_num]) < expected[row_num]:
+            return []
+        del expected[row_num]
+        return sorted(received.pop(row_num), key=lambda result: (result['check_in'] or '', result['check_out'] or ''))
+
+    def finish_row(row_results):
+        for result in row_results:
+            record_result(stats, result)
+            if result['source'] in ('store', 'resumed'):
+                stats['cache_hits'] += 1
+            elif result['source'] == 'seed':
+                stats['seed_hits'] += 1
+            elif result['source'] == 'http':
+                stats['http_hits'] += 1
+        return row_results
+
+    def give_up(item):
+        row_num, room_id, original_url, _ = item
+        print(f"❌ Row {row_num} crashed its worker {crashes[row_num]} times, giving up on it")
+        return [make_result(row_num, room_id, stay_in, stay_out, None, reconstruct_url(room_id, stay_in, stay_out, args.base_url),
+                            'browser')
+                for stay_in, stay_out in listing_stays(original_url, check_in, check_out, args)]
+
+    for worker_id, shard in enumerate(shards, start=1):
+        if shard:
+            start(worker_id, shard)
+
+    try:
+        while workers:
+            try:
+                message = results.get(timeout=1)
+            except queue.Empty:
+                message = None
+            if message:
+                yield from finish_row(handle(message))
+
+            # Look for workers that died without saying goodbye
+            for worker_id, (process, shard) in list(workers.items()):
+                if process.is_alive():
+                    continue
+                # Drain anything it managed to send before dying
+                try:
+                    while True:
+                        yield from finish_row(handle(results.get_nowait()))
+                except queue.Empty:
+                    pass
+                if worker_id not in workers:
+                    continue
+                del workers[worker_id]
+                unfinished = [item for item in shard if item[0] in expected]
+                if process.exitcode == RESTART_EXIT_CODE:
+                    print(f"🧠 Worker {worker_id} stopped at its memory cap, {len(unfinished)} listings to go")
+                else:
+                    print(f"💥 Worker {worker_id} died (exit code {process.exitcode}), "
+                          f"{len(unfinished)} listings unfinished")
+                for item in unfinished:
+                    received.pop(item[0], None)
+                if not unfinished:
+                    continue
+                if process.exitcode == RESTART_EXIT_CODE:
+                    start(worker_id, unfinished)
+                    continue
+                # The first unfinished listing was the one in flight
+                in_flight = unfinished[0][0]
+                crashes[in_flight] = crashes.get(in_flight, 0) + 1
+                if crashes[in_flight] > MAX_SHARD_RESTARTS:
+                    yield from finish_row(give_up(unfinished[0]))
+                    del expected[in_flight]
+                    unfinished = unfinished[1:]
+                if unfinished:
+                    start(worker_id, unfinished)
+    finally:
+        for process, _ in workers.values():
+            process.terminate()
+            process.join()
+
+    # Keep the summary in CSV order regardless of completion order
+    if stats['prices_found']:
+        stats['prices_found'].sort(key=lambda item: item['row'])
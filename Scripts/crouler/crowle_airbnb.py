@@ -1,24 +1,127 @@
-import re
-from playwright.sync_api import Playwright, sync_playwright, expect
-
-
-def run(playwright: Playwright) -> None:
-    browser = playwright.chromium.launch(headless=False)
-    context = browser.new_context()
-    page = context.new_page()
-    page.goto("https://www.airbnb.com/rooms/1013515193789896780?adults=1&search_mode=regular_search&category_tag=Tag%3A8678&check_in=2025-11-14&check_out=2025-11-19&children=0&infants=0&pets=0&photo_id=1809136199&source_impression_id=p3_1761116881_P3poysljzhOlkjv8&previous_page_section_name=1000&federated_search_id=5add8475-2fa6-4474-a686-3caa9246c6b0")
-    page.get_by_role("button", name="Close").click()
-    page.get_by_role("button", name="Change dates; Check-in: 2025-").click()
-    page.get_by_test_id("bookit-sidebar-availability-calendar").get_by_role("button", name="23, Sunday, November 2025.").click()
-    page.get_by_test_id("bookit-sidebar-availability-calendar").get_by_role("button", name="Move forward to switch to the").click()
-    page.get_by_test_id("bookit-sidebar-availability-calendar").get_by_role("button", name="12, Friday, December 2025.").click()
-    page.get_by_text("฿13,952Show price breakdown ฿13,952 for 19 nightsfor 19 nights").nth(1).click()
-    page.close()
-
-    # ---------------------
-    context.close()
-    browser.close()
-
-
-with sync_playwright() as playwright:
-    run(playwright)
+import argparse
+import asyncio
+import sys
+from urllib.parse import quote, urlencode, urljoin
+
+from playwright.async_api import async_playwright
+
+import airbnb_scraper
+from airbnb_parsing import SEED_PRICE_RE
+
+MAX_SEARCH_PAGES = 15  # Airbnb stops serving results after ~15 pages of 18 cards
+
+# Pricing options the streaming pipeline cannot honour: they need the whole listing set up front
+# (--workers, --schedule) or a sync run in a restartable child process (--long-run)
+UNSUPPORTED_OPTIONS = (
+    ('--workers', lambda args: args.workers > 1),
+    ('--schedule', lambda args: args.schedule),
+    ('--long-run', lambda args: args.long_run),
+)
+
+# Link and candidate price texts of every result card, in a single evaluate call
+SEARCH_CARDS_JS = """() => [...document.querySelectorAll("[data-testid='card-container']")].map(card => ({
+    href: (card.querySelector("a[href*='/rooms/']") || {}).href || '',
+    texts: [...card.querySelectorAll('span, div')]
+        .map(node => node.textContent.replace(/\\s+/g, ' ').trim())
+        .filter(text => / for \\d+ nights?/.test(text) && text.length < 80),
+}))"""
+
+NEXT_PAGE_JS = """() => (document.querySelector("a[aria-label='Next']") || {}).href || ''"""
+
+def search_url(location, check_in, check_out, adults=1, base_url=airbnb_scraper.BASE_URL):
+    """First results page of a search for `location` and the stay, on `base_url`"""
+    query = urlencode({'check_in': check_in, 'check_out': check_out, 'adults': adults})
+    return f"{base_url}/s/{quote(location)}/homes?{query}"
+
+def card_price_text(texts):
+    """The card's 'X for N nights' text, shortest match wins as outer nodes repeat inner text"""
+    matches = [text for text in texts if SEED_PRICE_RE.match(text)]
+    return min(matches, key=len) if matches else ''
+
+def parse_search_cards(cards, base_url):
+    """(room_id, url, price_text) for each result card that links to a room"""
+    listings = []
+    for card in cards:
+        url = urljoin(base_url, card['href'])
+        room_id = airbnb_scraper.extract_room_id(url)
+        if room_id:
+            listings.append((room_id, url, card_price_text(card['texts'])))
+    return listings
+
+async def crawl_search(location, check_in, check_out, adults=1, max_pages=MAX_SEARCH_PAGES, headless=True,
+                       limiter=None, stats=None, base_url=airbnb_scraper.BASE_URL):
+    """Page through search results, yielding (row_num, room_id, url, row) listings as each page lands
+
+    Rows look like seed CSV rows, [url, card price text], so --seed-prices
+    can answer a listing straight from its card. Pages are loaded through
+    `limiter` like listing pages, on a browser of the crawler's own.
+    """
+    url = search_url(location, check_in, check_out, adults, base_url)
+    row_num = 0
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=headless)
+        try:
+            page = await browser.new_page()
+            for page_num in range(1, max_pages + 1):
+                if limiter:
+                    delay = limiter.reserve(url)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                print(f"🔎 Search page {page_num}: {url}")
+                await page.goto(url, wait_until='domcontentloaded')
+                try:
+                    await page.get_by_test_id("card-container").first.wait_for(state="visible", timeout=15000)
+                except:
+                    print(f"⚠️  No result cards on search page {page_num}, stopping")
+                    break
+
+                listings = parse_search_cards(await page.evaluate(SEARCH_CARDS_JS), page.url)
+                print(f"🏘️  Search page {page_num}: {len(listings)} listings")
+                for room_id, room_url, price_text in listings:
+                    row_num += 1
+                    yield row_num, room_id, room_url, [room_url, price_text]
+
+                url = await page.evaluate(NEXT_PAGE_JS)
+                if not url:
+                    print(f"✅ Last search page reached after {page_num} pages")
+                    break
+        finally:
+            await browser.close()
+    if stats is not None:
+        stats['search_listings'] = row_num
+
+def search_parser():
+    parser = argparse.ArgumentParser(
+        description="Crawl Airbnb search results and price every listing while later pages are still loading",
+        epilog="Any other option is passed on to the pricing pipeline, see airbnb_scraper.py --help.")
+    parser.add_argument('location', help="search location, e.g. 'Chiang Mai, Thailand'")
+    parser.add_argument('--adults', type=int, default=1, help="guests to search for")
+    parser.add_argument('--max-pages', type=int, default=MAX_SEARCH_PAGES, help="stop after this many result pages")
+    return parser
+
+def parse_search_args(argv=None):
+    """Split search options from the pricing options, which go to airbnb_scraper.parse_args"""
+    return search_parser().parse_known_args(argv)
+
+def main(argv=None):
+    search, rest = parse_search_args(argv)
+    args = airbnb_scraper.parse_args(rest)
+    unsupported = [option for option, given in UNSUPPORTED_OPTIONS if given(args)]
+    if unsupported:
+        search_parser().error(f"{', '.join(unsupported)} cannot be used with the search crawler, "
+                              "only with airbnb_scraper.py on a seed CSV")
+    # Cards already link to the searched stay, so price each listing for its own dates
+    args.dates_from_url = True
+    print(f"🔎 Crawling search results for {search.location}, {args.check_in} to {args.check_out}")
+
+    def source(stats, limiter):
+        return crawl_search(search.location, args.check_in, args.check_out, search.adults, search.max_pages,
+                            args.headless, limiter, stats, args.base_url)
+
+    stats = airbnb_scraper.run(args, source=source)
+    if stats.get('search_listings') is not None:
+        print(f"🏘️  Search results crawled: {stats['search_listings']} cards")
+    return stats
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
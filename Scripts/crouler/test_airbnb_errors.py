@@ -0,0 +1,73 @@
+import socket
+
+import pytest
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+from airbnb_errors import (BlockedError, CircuitBreaker, ListingGone, NavigationTimeout, PriceNotFound, check_blocked,
+                           check_navigation, classify)
+
+def test_classify():
+    assert classify(NavigationTimeout("goto")) == 'nav_timeout'
+    assert classify(PriceNotFound("budget")) == 'price_not_found'
+    assert classify(PlaywrightTimeoutError("locator")) == 'selector_missing'
+    assert classify(TimeoutError("read")) == 'other'
+    assert classify(socket.timeout("read")) == 'other'
+    assert classify(ValueError("boom")) == 'other'
+
+def test_check_navigation():
+    check_navigation(200, 'https://www.airbnb.com/rooms/42?adults=1', '42')
+    with pytest.raises(BlockedError):
+        check_navigation(429, 'https://www.airbnb.com/rooms/42', '42')
+    with pytest.raises(ListingGone):
+        check_navigation(404, 'https://www.airbnb.com/rooms/42', '42')
+    with pytest.raises(ListingGone):
+        check_navigation(200, 'https://www.airbnb.com/s/homes', '42')
+    with pytest.raises(NavigationTimeout):
+        check_navigation(503, 'https://www.airbnb.com/rooms/42', '42')
+
+def test_check_blocked():
+    check_blocked("Entire home in Kraków")
+    with pytest.raises(BlockedError):
+        check_blocked("Please VERIFY YOU ARE A HUMAN")
+
+def test_breaker_needs_min_samples():
+    breaker = CircuitBreaker(min_samples=6)
+    for _ in range(5):
+        breaker.record('nav_timeout')
+    assert breaker.pause_for() == 0
+    breaker.record('nav_timeout')
+    assert 59 < breaker.pause_for() <= 60
+    assert breaker.counters() == {'trips': 1, 'failures': {'nav_timeout': 6}}
+
+def test_breaker_below_threshold():
+    breaker = CircuitBreaker(threshold=0.5, min_samples=6)
+    for kind in ('other', None, None, 'other', None, None, 'other'):
+        breaker.record(kind)
+    assert breaker.pause_for() == 0
+
+def test_breaker_ignores_gone_listings():
+    breaker = CircuitBreaker(min_samples=2)
+    for _ in range(10):
+        breaker.record('listing_gone')
+    assert breaker.pause_for() == 0
+    assert breaker.counters() == {'trips': 0, 'failures': {'listing_gone': 10}}
+
+def test_breaker_disabled():
+    breaker = CircuitBreaker(threshold=0, min_samples=1)
+    for _ in range(10):
+        breaker.record('blocked')
+    assert breaker.pause_for() == 0
+
+def test_breaker_cooldown_doubles_until_success():
+    breaker = CircuitBreaker(min_samples=2, cooldown=60, max_cooldown=200)
+    pauses = []
+    for _ in range(3):
+        breaker.record('blocked')
+        breaker.record('blocked')
+        pauses.append(round(breaker.pause_for()))
+    assert pauses == [60, 120, 200]
+
+    breaker.record(None)
+    breaker.record('blocked')
+    breaker.record('blocked')
+    assert round(breaker.pause_for()) == 60
@@ -0,0 +1,85 @@
+import csv
+import json
+import os
+
+from airbnb_parsing import Price, analyse_snapshot, parse_booking_payload, parse_seed_price, snapshot_from_html
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def fixture(name):
+    with open(os.path.join(HERE, 'fixtures', name), encoding='utf-8') as file:
+        return file.read()
+
+def seed_rows():
+    with open(os.path.join(HERE, 'airbnb.csv'), newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+def test_booking_payload_available():
+    booking = parse_booking_payload(json.loads(fixture('stays_pdp_sections_available.json')))
+    assert booking == {
+        'price': Price(13952.0, '฿', 19, '฿13,952'),
+        'amount': 13952.0,
+        'currency': '฿',
+        'nights': 19,
+        'original_price': None,
+        'available': True,
+    }
+    assert str(booking['price']) == '฿13,952'
+
+def test_booking_payload_discounted():
+    booking = parse_booking_payload(json.loads(fixture('stays_pdp_sections_discounted.json')))
+    assert booking == {
+        'price': Price(324.0, 'zł', 5, '324 zł'),
+        'amount': 324.0,
+        'currency': 'zł',
+        'nights': 5,
+        'original_price': '355 zł',
+        'available': True,
+    }
+
+def test_booking_payload_unavailable():
+    booking = parse_booking_payload(json.loads(fixture('stays_pdp_sections_unavailable.json')))
+    assert booking == {
+        'price': None,
+        'amount': None,
+        'currency': None,
+        'nights': None,
+        'original_price': None,
+        'available': False,
+    }
+
+def test_booking_payload_without_booking():
+    assert parse_booking_payload({'data': {'presentation': {}}}) is None
+
+def test_snapshot_available():
+    snapshot = snapshot_from_html(fixture('listing_available.html'))
+    assert analyse_snapshot(snapshot) == (True, None, Price(13952.0, '฿', 19, '฿13,952'))
+
+def test_snapshot_unavailable():
+    snapshot = snapshot_from_html(fixture('listing_unavailable.html'))
+    assert analyse_snapshot(snapshot) == (False, 'Those dates are not available', None)
+
+def test_seed_price():
+    rows = seed_rows()
+    assert parse_seed_price(rows[1]) == {
+        'price': Price(278.0, 'zł', 5, '278 zł'),
+        'amount': 278.0,
+        'currency': 'zł',
+        'nights': 5,
+        'original_price': None,
+    }
+
+def test_seed_price_discounted():
+    rows = seed_rows()
+    assert parse_seed_price(rows[2]) == {
+        'price': Price(324.0, 'zł', 5, '324 zł'),
+        'amount': 324.0,
+        'currency': 'zł',
+        'nights': 5,
+        'original_price': '355 zł',
+    }
+
+def test_seed_price_every_row():
+    header, *rows = seed_rows()
+    assert parse_seed_price(header) is None
+    assert all(parse_seed_price(row) for row in rows)
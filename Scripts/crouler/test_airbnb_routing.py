@@ -0,0 +1,53 @@
+from airbnb_routing import DEFAULT_ESTIMATED_BYTES, ESTIMATED_BYTES, RoutePolicy
+
+class Request:
+    def __init__(self, url, resource_type):
+        self.url = url
+        self.resource_type = resource_type
+
+class Route:
+    def __init__(self, url, resource_type):
+        self.request = Request(url, resource_type)
+        self.outcome = None
+
+    def abort(self):
+        self.outcome = 'abort'
+
+    def continue_(self):
+        self.outcome = 'continue'
+
+def test_should_block():
+    policy = RoutePolicy()
+    assert policy.should_block('https://a0.muscache.com/im/pictures/1.jpg', 'image')
+    assert policy.should_block('https://www.googletagmanager.com/gtm.js', 'script')
+    assert not policy.should_block('https://www.airbnb.com/rooms/42', 'document')
+    assert not policy.should_block('data:image/png;base64,AAAA', 'image')
+    # Allow patterns win over blocked types and deny patterns
+    assert not policy.should_block('https://www.airbnb.com/api/v3/StaysPdpSections?tracking/', 'fetch')
+
+def test_handle_counts_savings():
+    policy = RoutePolicy()
+    routes = [Route('https://a0.muscache.com/im/pictures/1.jpg', 'image'),
+              Route('https://sentry.io/api/1/envelope/', 'ping'),
+              Route('https://www.airbnb.com/rooms/42', 'document')]
+    for route in routes:
+        policy.handle(route)
+    assert [route.outcome for route in routes] == ['abort', 'abort', 'continue']
+    assert policy.counters() == {
+        'allowed_requests': 1,
+        'blocked_requests': 2,
+        'bytes_saved': ESTIMATED_BYTES['image'] + ESTIMATED_BYTES['ping'],
+        'blocked_by_type': {'image': 1, 'ping': 1},
+    }
+
+def test_merge_worker_counters():
+    policy = RoutePolicy()
+    policy.handle(Route('https://a0.muscache.com/im/pictures/1.jpg', 'image'))
+    policy.merge({'allowed_requests': 3, 'blocked_requests': 1, 'bytes_saved': DEFAULT_ESTIMATED_BYTES,
+                  'blocked_by_type': {'image': 1}})
+    assert policy.counters() == {
+        'allowed_requests': 3,
+        'blocked_requests': 2,
+        'bytes_saved': ESTIMATED_BYTES['image'] + DEFAULT_ESTIMATED_BYTES,
+        'blocked_by_type': {'image': 2},
+    }
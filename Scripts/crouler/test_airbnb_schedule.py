@@ -0,0 +1,79 @@
+import time
+from datetime import date
+
+from airbnb_schedule import NEVER_CHECKED, schedule_listings, stay_priority
+
+NOW = 1_700_000_000.0
+TODAY = date(2025, 11, 1)
+DAY = 86400
+
+def entry(days_ago, amount=300.0, status='price', now=NOW):
+    return {'amount': amount, 'status': status, 'scraped_at': now - days_ago * DAY}
+
+class HistoryStore:
+    """Stands in for ResultStore.history with fixed histories per room"""
+
+    def __init__(self, histories):
+        self.histories = histories
+
+    def history(self, room_id, check_in, check_out):
+        return self.histories.get(room_id, [])
+
+def test_priority_never_checked():
+    assert stay_priority([], '2025-12-01', NOW, TODAY) == NEVER_CHECKED
+
+def test_priority_stay_started():
+    assert stay_priority([entry(1)], '2025-10-31', NOW, TODAY) is None
+
+def test_priority_older_check_first():
+    assert stay_priority([entry(5)], None, NOW, TODAY) > stay_priority([entry(1)], None, NOW, TODAY)
+
+def test_priority_volatile_price_first():
+    steady = [entry(2, 300.0), entry(3, 300.0)]
+    moving = [entry(2, 300.0), entry(3, 450.0)]
+    assert stay_priority(moving, None, NOW, TODAY) > stay_priority(steady, None, NOW, TODAY)
+
+def test_priority_sooner_stay_first():
+    assert (stay_priority([entry(2)], '2025-11-02', NOW, TODAY)
+            > stay_priority([entry(2)], '2026-03-01', NOW, TODAY))
+
+def test_priority_booked_stay_bonus():
+    assert (stay_priority([entry(2, None, 'not_available')], None, NOW, TODAY)
+            > stay_priority([entry(2)], None, NOW, TODAY))
+
+def listings(*room_ids):
+    return [(row_num, room_id, f"https://www.airbnb.com/rooms/{room_id}", []) for row_num, room_id in
+            enumerate(room_ids, 1)]
+
+def test_schedule_most_urgent_first():
+    now = time.time()
+    store = HistoryStore({'1': [entry(1, now=now)], '2': [entry(30, now=now)]})
+    scheduled = schedule_listings(listings('1', '2', '3'), lambda url: [(None, None)], store, 10)
+    order = [room_id for _, room_id, _, _ in scheduled]
+    assert order == ['3', '2', '1']
+
+def test_schedule_budget_defers_rest():
+    stats = {}
+    scheduled = list(schedule_listings(listings('1', '2', '3'), lambda url: [(None, None)], HistoryStore({}), 2,
+                                       stats))
+    assert len(scheduled) == 2
+    assert stats == {'deferred': 1, 'past_stays': 0}
+
+def test_schedule_browserless_listings_are_free():
+    stats = {'browserless': 0}
+    handed_out = []
+    for item in schedule_listings(listings('1', '2', '3', '4'), lambda url: [(None, None)], HistoryStore({}), 2,
+                                  stats):
+        handed_out.append(item)
+        if len(handed_out) == 1:
+            stats['browserless'] += 1  # answered from the store, no page load
+    assert len(handed_out) == 3
+    assert stats['deferred'] == 1
+
+def test_schedule_skips_started_stays():
+    stays = {'https://www.airbnb.com/rooms/1': [('2025-01-01', '2025-01-05')],
+             'https://www.airbnb.com/rooms/2': [('2099-01-01', '2099-01-05')]}
+    stats = {}
+    scheduled = list(schedule_listings(listings('1', '2'), stays.get, HistoryStore({}), 10, stats))
+    assert [room_id for _, room_id, _, _ in scheduled] == ['2']
+    assert stats == {'deferred': 0, 'past_stays': 1}
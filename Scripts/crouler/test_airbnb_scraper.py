@@ -0,0 +1,130 @@
+import csv
+import json
+import time
+from argparse import Namespace
+
+import pytest
+
+from airbnb_errors import ListingGone, NavigationTimeout
+from airbnb_parsing import Price
+from airbnb_scraper import (PHASE_BUDGETS, PoolState, RateLimiter, ResultWriter, attempt_failed, booking_price,
+                            cached_price, make_result, retry_delay)
+from airbnb_store import ResultStore
+
+STAYS = [('2025-11-23', '2025-11-28'), ('2025-12-01', '2025-12-05')]
+PRICE = Price(278.0, 'zł', 5, '278 zł')
+
+def result(room_id, stay, price, source='browser'):
+    return make_result(1, room_id, *stay, price, f"https://www.airbnb.com/rooms/{room_id}", source)
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+def test_writer_matrix_row_once_room_complete(tmp_path):
+    matrix = str(tmp_path / 'matrix.csv')
+    writer = ResultWriter([str(tmp_path / 'out.jsonl')], matrix, STAYS)
+    writer.write(result('1', STAYS[0], PRICE))
+    writer.write(result('2', STAYS[0], None))
+    writer.write(result('1', STAYS[1], "Not Available"))
+    writer.close()
+    # Room 2 is still missing a stay, so it has no row yet
+    assert read_csv(matrix) == [['room_id', '2025-11-23:2025-11-28', '2025-12-01:2025-12-05'],
+                                ['1', '278 zł', 'Not Available']]
+    assert list(writer.pending) == ['2']
+
+def test_writer_append_leaves_out_resumed(tmp_path):
+    out = str(tmp_path / 'out.jsonl')
+    matrix = str(tmp_path / 'matrix.csv')
+    writer = ResultWriter([out], matrix, STAYS)
+    writer.write(result('1', STAYS[0], PRICE))
+    writer.write(result('1', STAYS[1], PRICE))
+    writer.close()
+
+    # The restarted run gets room 1 back from the store and prices room 2
+    writer = ResultWriter([out], matrix, STAYS, append=True)
+    writer.write(result('1', STAYS[0], PRICE, 'resumed'))
+    writer.write(result('1', STAYS[1], PRICE, 'resumed'))
+    writer.write(result('2', STAYS[0], PRICE, 'resumed'))
+    writer.write(result('2', STAYS[1], "Not Available"))
+    writer.close()
+
+    with open(out, encoding='utf-8') as file:
+        written = [(line['room_id'], line['source']) for line in map(json.loads, file)]
+    assert written == [('1', 'browser'), ('1', 'browser'), ('2', 'browser')]
+    assert read_csv(matrix) == [['room_id', '2025-11-23:2025-11-28', '2025-12-01:2025-12-05'],
+                                ['1', '278 zł', '278 zł'],
+                                ['2', '278 zł', 'Not Available']]
+
+def stored(tmp_path, seconds_ago):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    store.record('42', *STAYS[0], PRICE)
+    store.conn.execute("UPDATE results SET scraped_at = ?", (time.time() - seconds_ago,))
+    store.conn.commit()
+    return store
+
+def test_cached_price_within_ttl(tmp_path):
+    store = stored(tmp_path, 60)
+    args = Namespace(resume=False, ttl=3600, resume_since=None)
+    assert cached_price(store, '42', *STAYS[0], args) == (PRICE, 'store')
+    assert cached_price(stored(tmp_path, 7200), '42', *STAYS[0], args) == (None, None)
+    assert cached_price(None, '42', *STAYS[0], args) == (None, None)
+
+def test_cached_price_resumed_session(tmp_path):
+    args = Namespace(resume=False, ttl=3600, resume_since=time.time() - 7200)
+    # Stored by this session before the restart, older than the TTL
+    assert cached_price(stored(tmp_path, 5400), '42', *STAYS[0], args) == (PRICE, 'resumed')
+    # Stored by an earlier session, still within the TTL
+    args.resume_since = time.time() - 30
+    assert cached_price(stored(tmp_path, 60), '42', *STAYS[0], args) == (PRICE, 'store')
+    # Stored long before the session started
+    assert cached_price(stored(tmp_path, 30 * 86400), '42', *STAYS[0], args) == (None, None)
+
+def test_cached_price_resume_ignores_age(tmp_path):
+    args = Namespace(resume=True, ttl=3600, resume_since=None)
+    assert cached_price(stored(tmp_path, 30 * 86400), '42', *STAYS[0], args) == (PRICE, 'store')
+
+def test_rate_limiter_spaces_requests_per_host():
+    limiter = RateLimiter(rpm=60, burst=2)
+    assert limiter.reserve('https://www.airbnb.com/rooms/1') == 0
+    assert limiter.reserve('https://www.airbnb.com/rooms/2') == 0
+    assert limiter.reserve('https://www.airbnb.com/rooms/3') == pytest.approx(1.0, abs=0.01)
+    assert limiter.reserve('https://www.airbnb.pl/rooms/3') == 0
+
+def test_booking_price():
+    assert booking_price(None) is None
+    assert booking_price({'price': PRICE, 'available': True}) == PRICE
+    assert booking_price({'price': None, 'available': False}) == "Not Available"
+
+def test_retry_decisions():
+    assert attempt_failed(NavigationTimeout("goto"), "Attempt 1", "room 42")
+    assert not attempt_failed(ListingGone("HTTP 404"), "Attempt 1", "room 42")
+    assert retry_delay(1, 3, PHASE_BUDGETS) == PHASE_BUDGETS['backoff'] / 1000
+    assert retry_delay(2, 3, PHASE_BUDGETS, RateLimiter()) == 0
+    assert retry_delay(3, 3, PHASE_BUDGETS) is None
+
+class Browser:
+    connected = True
+
+    def is_connected(self):
+        return self.connected
+
+def test_pool_state_release_decisions():
+    pool = PoolState(None, max_context_uses=2)
+    pool.browser = Browser()
+    context = pool._checkout(object())
+    assert pool._checkin(context, crashed=False) == (True, True)
+    pool.session_saved = True
+    assert pool._checkout(context) is context
+    assert pool._checkin(context, crashed=False) == (True, False)  # used up, saved once more before closing
+
+    context = pool._checkout(object())
+    assert pool._checkin(context, crashed=True) == (False, False)
+    assert pool.browser is not None
+
+    context = pool._checkout(object())
+    pool.browser.connected = False
+    assert pool._checkin(context, crashed=True) == (False, False)
+    assert pool.browser is None
+    context = pool._checkout(object())
+    assert pool._checkin(context, crashed=False) == (False, False)
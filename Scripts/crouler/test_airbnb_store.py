@@ -0,0 +1,46 @@
+import time
+
+from airbnb_parsing import Price
+from airbnb_store import ResultStore, price_status
+
+PRICE = Price(278.0, 'zł', 5, '278 zł')
+
+def age(store, room_id, seconds):
+    """Pretend the stored result of a room was scraped `seconds` ago"""
+    store.conn.execute("UPDATE results SET scraped_at = ? WHERE room_id = ?", (time.time() - seconds, room_id))
+    store.conn.commit()
+
+def test_price_status():
+    assert price_status(PRICE) == 'price'
+    assert price_status("Not Available") == 'not_available'
+    assert price_status(None) == 'failed'
+
+def test_lookup_within_ttl(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    store.record('42', '2025-11-23', '2025-11-28', PRICE, row_num=1)
+    row = store.lookup('42', '2025-11-23', '2025-11-28', ttl=3600)
+    assert (row['price'], row['status'], row['attempts'], row['row_num']) == ('278 zł', 'price', 1, 1)
+    assert store.lookup('42', '2025-11-24', '2025-11-28', ttl=3600) is None
+
+def test_lookup_expired(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    store.record('42', '2025-11-23', '2025-11-28', PRICE)
+    age(store, '42', 7200)
+    assert store.lookup('42', '2025-11-23', '2025-11-28', ttl=3600) is None
+    assert store.lookup('42', '2025-11-23', '2025-11-28', ttl=None)['price'] == '278 zł'
+
+def test_lookup_skips_failures(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    store.record('42', None, None, None)
+    store.record('43', None, None, "Not Available")
+    assert store.lookup('42', None, None, ttl=None) is None
+    assert store.lookup('43', None, None, ttl=None)['status'] == 'not_available'
+
+def test_record_counts_attempts_and_keeps_history(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    store.record('42', '2025-11-23', '2025-11-28', None)
+    time.sleep(0.01)  # history is ordered by scrape time
+    store.record('42', '2025-11-23', '2025-11-28', PRICE)
+    assert store.get('42', '2025-11-23', '2025-11-28')['attempts'] == 2
+    history = store.history('42', '2025-11-23', '2025-11-28')
+    assert [(entry['amount'], entry['status']) for entry in history] == [(278.0, 'price'), (None, 'failed')]
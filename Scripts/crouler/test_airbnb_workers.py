@@ -0,0 +1,29 @@
+import multiprocessing
+
+import pytest
+
+from airbnb_workers import SharedCircuitBreaker, SharedRateLimiter
+
+def trip(breaker):
+    breaker.record('blocked')
+    breaker.record('blocked')
+
+def test_shared_rate_limiter_hands_out_slots():
+    limiter = SharedRateLimiter(rpm=60)
+    delays = [limiter.reserve('https://www.airbnb.com/rooms/1') for _ in range(3)]
+    assert delays == pytest.approx([0.0, 1.0, 2.0], abs=0.05)
+
+def test_shared_breaker_keeps_latest_pause():
+    breaker = SharedCircuitBreaker(cooldown=60)
+    breaker.open_until = 100.0
+    breaker.open_until = 50.0  # a worker with an older, shorter trip does not shorten it
+    assert breaker.open_until == 100.0
+
+def test_shared_breaker_trip_reaches_other_workers():
+    breaker = SharedCircuitBreaker(cooldown=60)
+    breaker.min_samples = 2
+    worker = multiprocessing.get_context('fork').Process(target=trip, args=(breaker,))
+    worker.start()
+    worker.join()
+    assert 59 < breaker.pause_for() <= 60
+    assert breaker.trips == 0  # counted where it happened